@@ -7,16 +7,234 @@ Implements rate limiting and specialized prompts for PDF-to-HTML conversion.
 
 import google.generativeai as genai
 import asyncio
-import base64
+import hashlib
+import re
+from time import monotonic
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
 from pathlib import Path
 import logging
 import os
+import orjson
 from dotenv import load_dotenv
+from pydantic import BaseModel
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Markdown code fences that Gemini frequently wraps JSON responses in
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?|```$', re.MULTILINE)
+
+# Sentinel separating per-page documents in a batched generation response
+_BATCH_SENTINEL_RE = re.compile(r'<!--\s*PAGE\s+(\d+)\s*-->')
+
+# Pages sent per batched generation request. Keeps the combined prompt
+# comfortably inside the context window while still amortizing per-call
+# overhead over several pages.
+_BATCH_SIZE_LIMIT = 5
+
+
+class SimilarityReport(BaseModel):
+    """Validated visual similarity analysis returned by Gemini."""
+    overall_score: int = 7
+    text_accuracy: int = 7
+    layout_similarity: int = 7
+    color_accuracy: int = 7
+    typography_match: int = 7
+    major_differences: List[str] = []
+    recommendations: List[str] = []
+
+# Images below this size are sent inline with the generation request;
+# larger ones fall back to the Files API.
+_INLINE_IMAGE_LIMIT = 20 * 1024 * 1024
+
+# API key the SDK was last configured with. The SDK keeps one transport
+# session per configuration, so reconfiguring on every client construction
+# would throw away warm TCP+TLS connections.
+_configured_api_key: Optional[str] = None
+
+
+def _configure_genai(api_key: str) -> None:
+    """
+    Configure the Gemini SDK once per process.
+
+    Uses the REST transport so all calls share the SDK's keep-alive HTTP
+    session instead of paying a fresh TCP+TLS handshake per request, and
+    skips reconfiguration when another client already set the same key.
+    """
+    global _configured_api_key
+    if _configured_api_key == api_key:
+        return
+    genai.configure(api_key=api_key, transport='rest')
+    _configured_api_key = api_key
+
+# Version prefix for the generated-HTML cache. Bump when prompt or model
+# changes would make previously generated HTML stale.
+_HTML_CACHE_VERSION = "v1"
+
+# Version suffix for cached prompt resources. Bump whenever the static prompt
+# text below changes so stale cachedContents entries are not reused.
+_PROMPT_CACHE_VERSION = "v1"
+
+# Static instruction prefix for initial HTML generation. Kept free of any
+# per-page values so it can live in a Gemini context cache and be shared
+# across every page of every document.
+_INITIAL_SYSTEM_PROMPT = """You are an expert frontend developer tasked with converting a PDF page image into accurate HTML5 and CSS code.
+
+CRITICAL REQUIREMENTS:
+1. Analyze this image carefully and recreate it as HTML with embedded CSS
+2. Include ALL text content exactly as shown in the image
+3. Preserve the visual layout, fonts, colors, and spacing as closely as possible
+4. Use semantic HTML5 elements where appropriate
+5. Embed ALL CSS within a <style> tag in the <head>
+6. DO NOT use external libraries or frameworks
+7. Make the page responsive but prioritize exact visual matching
+8. Pay special attention to:
+   - Font families, sizes, and weights
+   - Colors and backgrounds
+   - Margins, padding, and spacing
+   - Text alignment and line heights
+   - Any images, graphics, or special formatting
+
+RESPONSE FORMAT:
+Return ONLY the complete HTML document, starting with <!DOCTYPE html> and ending with </html>.
+Do not include any explanations or markdown formatting."""
+
+# Static instruction prefix for the refinement pass, cached the same way.
+_REFINE_SYSTEM_PROMPT = """You are a visual quality control system for frontend development. Your task is to perfect HTML code by comparing its rendered output with a target image.
+
+INPUTS PROVIDED:
+1. TARGET IMAGE: The original PDF page that we want to recreate perfectly
+2. CURRENT RENDERING: Screenshot of how the current HTML code looks when rendered
+3. CURRENT HTML CODE: The code that produced the current rendering
+
+YOUR MISSION:
+Analyze the visual differences between the TARGET IMAGE and CURRENT RENDERING, then modify the HTML code to eliminate these differences.
+
+ANALYSIS FOCUS:
+- Text content accuracy and completeness
+- Font families, sizes, weights, and styles
+- Colors (text, backgrounds, borders)
+- Layout and positioning
+- Spacing (margins, padding, line-height)
+- Element alignment and justification
+- Missing or incorrectly positioned elements
+- Overall visual hierarchy and structure
+
+REFINEMENT GUIDELINES:
+1. Fix ANY visual discrepancies you identify
+2. Maintain the existing HTML structure if it's working well
+3. Adjust CSS properties to match the target image exactly
+4. Add missing content or elements if they exist in target but not current rendering
+5. Correct any text that doesn't match exactly
+6. Ensure colors, fonts, and spacing are pixel-perfect when possible
+
+RESPONSE FORMAT:
+Return ONLY the improved HTML code. Start with <!DOCTYPE html> and end with </html>.
+Do not include explanations, comments, or markdown formatting."""
+
+# Per-call delta templates. Hoisted to module scope and rendered with
+# str.format_map so the multi-line literals are parsed once at import
+# instead of being rebuilt as f-strings per call, and so the delta text
+# stays byte-stable for cache keying.
+_INITIAL_PAGE_PROMPT = """PAGE INFORMATION:
+- Page number: {page_number}
+- Original dimensions: {width}pt x {height}pt
+- Image resolution: {pixel_width}px x {pixel_height}px"""
+
+_REFINE_PAGE_PROMPT = """PAGE INFORMATION:
+- Page: {page_number}
+- Refinement iteration: {iteration}
+- Target dimensions: {width}pt x {height}pt
+
+CURRENT HTML CODE:
+{current_html}"""
+
+# Static prompt for the similarity analysis pass
+_SIMILARITY_PROMPT = """Compare these two images and provide a detailed analysis of their visual similarity.
+
+Analyze and rate (1-10 scale) the following aspects:
+1. Text content accuracy and completeness
+2. Layout and positioning similarity
+3. Color accuracy
+4. Font and typography matching
+5. Overall visual fidelity
+
+Provide a JSON response with:
+- overall_score: number (1-10, where 10 is perfect match)
+- text_accuracy: number (1-10)
+- layout_similarity: number (1-10) 
+- color_accuracy: number (1-10)
+- typography_match: number (1-10)
+- major_differences: array of strings describing key differences
+- recommendations: array of strings with improvement suggestions
+
+Return only valid JSON, no other text."""
+
+
+class AsyncRateLimiter:
+    """
+    Token-bucket rate limiter for async API calls.
+    Allows bursts up to the bucket capacity while enforcing the average rate,
+    so multiple requests can be in flight concurrently up to the RPM quota.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            max_rate: Maximum number of acquisitions per time period
+            time_period: Length of the rate window in seconds
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._rate_per_sec = max_rate / time_period
+        self._level = 0.0
+        self._last_check = 0.0
+        self._waiters: Dict[asyncio.Task, asyncio.Future] = {}
+
+    def _leak(self) -> None:
+        """Drain the bucket according to how much time has passed."""
+        current_time = monotonic()
+        if self._level:
+            elapsed = current_time - self._last_check
+            self._level = max(self._level - elapsed * self._rate_per_sec, 0)
+        self._last_check = current_time
+
+    def has_capacity(self, amount: float = 1) -> bool:
+        """Check if there is enough capacity left in the bucket."""
+        self._leak()
+        requested = self._level + amount
+        # Wake one pending waiter when room opens up
+        if requested < self.max_rate:
+            for fut in self._waiters.values():
+                if not fut.done():
+                    fut.set_result(True)
+                    break
+        return requested <= self.max_rate
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until the bucket has capacity, then consume it."""
+        task = asyncio.current_task()
+        while not self.has_capacity(amount):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters[task] = fut
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), amount / self._rate_per_sec)
+            except asyncio.TimeoutError:
+                pass
+            fut.cancel()
+        self._waiters.pop(task, None)
+        self._level += amount
+
+    async def __aenter__(self):
+        await self.acquire()
+        return None
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return None
+
 
 class GeminiClient:
     """
@@ -24,198 +242,568 @@ class GeminiClient:
     Specialized for PDF to HTML conversion with iterative refinement.
     """
     
-    def __init__(self, api_key: Optional[str] = None, rate_limit_seconds: int = 5):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_rate_per_minute: int = 12,
+        time_period: int = 60
+    ):
         """
         Initialize Gemini API client.
-        
+
         Args:
             api_key: Google AI API key (if None, loads from env)
-            rate_limit_seconds: Seconds to wait between API calls
+            max_rate_per_minute: Maximum API calls allowed per rate window
+            time_period: Length of the rate window in seconds
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        self.rate_limit_seconds = rate_limit_seconds
-        self.last_call_time = 0
-        
+        self._limiter = AsyncRateLimiter(max_rate_per_minute, time_period)
+
+        # Cap concurrent in-flight API calls so a large gather of pages
+        # cannot open an unbounded number of HTTP requests (GEMINI_CONCURRENCY)
+        self._api_sem = asyncio.Semaphore(int(os.getenv('GEMINI_CONCURRENCY', '8')))
+
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is required")
-        
-        # Configure Gemini
-        genai.configure(api_key=self.api_key)
+
+        # Configure Gemini (shared transport session per process)
+        _configure_genai(self.api_key)
         self.model = genai.GenerativeModel('gemini-1.5-pro')
-        
+
+        # Context caches for the static prompt prefixes (created lazily on
+        # first use so client construction stays cheap and offline-safe)
+        self._caches_initialized = False
+        self._initial_cache_name: Optional[str] = None
+        self._refine_cache_name: Optional[str] = None
+        self._initial_model = None
+        self._refine_model = None
+
+        # Per-page cached-content models keyed by cache resource name
+        self._page_cache_models: Dict[str, Any] = {}
+
+        # Memoized initial HTML keyed by image content hash. Repeated pages
+        # (blanks, boilerplate) skip the API call entirely; the disk tier
+        # lets reruns after a crash skip already-converted pages.
+        self._html_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._html_cache_max = 256
+        self._html_cache_dir = Path(os.getenv("HTML_CACHE_DIR", "./cache/html"))
+        self._html_cache_dir.mkdir(exist_ok=True, parents=True)
+
         logger.info("Gemini client initialized successfully")
-    
-    async def _rate_limit(self) -> None:
-        """Implement rate limiting between API calls."""
-        import time
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_call_time
-        
-        if time_since_last_call < self.rate_limit_seconds:
-            sleep_time = self.rate_limit_seconds - time_since_last_call
-            logger.debug(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-            await asyncio.sleep(sleep_time)
-        
-        self.last_call_time = time.time()
-    
-    def _encode_image(self, image_path: str) -> str:
+
+    def _initial_html_cache_key(self, image_path: Optional[str] = None, image_bytes: Optional[bytes] = None) -> str:
+        """Build a versioned content-hash key for a page image."""
+        if image_bytes is None:
+            image_bytes = Path(image_path).read_bytes()
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{_HTML_CACHE_VERSION}-{digest}"
+
+    def _lookup_cached_html(self, cache_key: str) -> Optional[str]:
+        """Look up generated HTML in the memory tier, then on disk."""
+        cached = self._html_cache.get(cache_key)
+        if cached is not None:
+            self._html_cache.move_to_end(cache_key)
+            return cached
+
+        cache_file = self._html_cache_dir / f"{cache_key}.html"
+        try:
+            if cache_file.exists():
+                html = cache_file.read_text(encoding='utf-8')
+                self._store_cached_html(cache_key, html, persist=False)
+                return html
+        except Exception as e:
+            logger.warning(f"Failed to read HTML cache entry {cache_key}: {str(e)}")
+        return None
+
+    def _store_cached_html(self, cache_key: str, html: str, persist: bool = True) -> None:
+        """Store generated HTML in the LRU memory tier and on disk."""
+        self._html_cache[cache_key] = html
+        self._html_cache.move_to_end(cache_key)
+        while len(self._html_cache) > self._html_cache_max:
+            self._html_cache.popitem(last=False)
+
+        if persist:
+            try:
+                (self._html_cache_dir / f"{cache_key}.html").write_text(html, encoding='utf-8')
+            except Exception as e:
+                logger.warning(f"Failed to persist HTML cache entry {cache_key}: {str(e)}")
+
+    async def _ensure_prompt_caches(self) -> None:
         """
-        Encode image to base64 string.
-        
+        Create cachedContents resources for the static prompt prefixes.
+
+        The cached tokens are billed at a discount and are not re-transmitted
+        on every page, so only the small per-page delta travels with each
+        request. The CachedContent.create calls are synchronous network
+        round-trips, so they run in a worker thread to keep the event loop
+        free. Falls back to inlining the full prompts if the caching API
+        is unavailable.
+        """
+        if self._caches_initialized:
+            return
+        self._caches_initialized = True
+
+        try:
+            initial_cache = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model='models/gemini-1.5-pro',
+                display_name=f'pdf2html-initial-{_PROMPT_CACHE_VERSION}',
+                contents=[_INITIAL_SYSTEM_PROMPT],
+                ttl=3600
+            )
+            refine_cache = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model='models/gemini-1.5-pro',
+                display_name=f'pdf2html-refine-{_PROMPT_CACHE_VERSION}',
+                contents=[_REFINE_SYSTEM_PROMPT],
+                ttl=3600
+            )
+            self._initial_cache_name = initial_cache.name
+            self._refine_cache_name = refine_cache.name
+            self._initial_model = genai.GenerativeModel.from_cached_content(initial_cache)
+            self._refine_model = genai.GenerativeModel.from_cached_content(refine_cache)
+            logger.info("Gemini prompt caches created")
+        except Exception as e:
+            logger.warning(f"Context caching unavailable, using inline prompts: {str(e)}")
+
+    async def close(self) -> None:
+        """Release remote resources held by this client (prompt caches)."""
+        for cache_name in (self._initial_cache_name, self._refine_cache_name):
+            if cache_name:
+                try:
+                    genai.caching.CachedContent(name=cache_name).delete()
+                except Exception as e:
+                    logger.warning(f"Failed to delete prompt cache {cache_name}: {str(e)}")
+        self._initial_cache_name = None
+        self._refine_cache_name = None
+        self._initial_model = None
+        self._refine_model = None
+
+
+    async def create_page_cache(
+        self,
+        image_path: Optional[str] = None,
+        image_bytes: Optional[bytes] = None,
+        page_number: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Create a cachedContents resource for one page's refinement loop.
+
+        Holds the refinement instructions plus the original page image so
+        iteration calls only ship the screenshot and the per-call delta.
+        Returns None (and the callers fall back to inline payloads) when
+        the caching API is unavailable.
+
+        Args:
+            image_path: Path to the original page image
+            image_bytes: In-memory encoded original page image
+            page_number: Page number, used for the display name
+
+        Returns:
+            The cache resource name, or None on failure
+        """
+        try:
+            if image_bytes is not None:
+                image_part = self._bytes_part(image_bytes)
+            else:
+                image_part = await asyncio.to_thread(self._load_inline_part, image_path)
+
+            cache = await asyncio.to_thread(
+                genai.caching.CachedContent.create,
+                model='models/gemini-1.5-pro',
+                display_name=f'pdf2html-page-{page_number}-{_PROMPT_CACHE_VERSION}',
+                contents=[_REFINE_SYSTEM_PROMPT, image_part],
+                ttl=300
+            )
+            self._page_cache_models[cache.name] = genai.GenerativeModel.from_cached_content(cache)
+            logger.info(f"Created page cache for page {page_number}")
+            return cache.name
+        except Exception as e:
+            logger.warning(f"Page caching unavailable for page {page_number}: {str(e)}")
+            return None
+
+    async def delete_page_cache(self, cache_name: Optional[str]) -> None:
+        """Delete a per-page cache created by create_page_cache."""
+        if not cache_name:
+            return
+        self._page_cache_models.pop(cache_name, None)
+        try:
+            await asyncio.to_thread(genai.caching.CachedContent(name=cache_name).delete)
+        except Exception as e:
+            logger.warning(f"Failed to delete page cache {cache_name}: {str(e)}")
+
+    def _load_inline_part(self, image_path: str) -> Dict[str, Any]:
+        """
+        Load an image file as an inline request part.
+
         Args:
             image_path: Path to image file
-            
+
         Returns:
-            Base64 encoded image string
+            Part dictionary with mime type and raw image bytes
         """
         try:
+            suffix = Path(image_path).suffix.lower()
+            mime_type = 'image/jpeg' if suffix in ('.jpg', '.jpeg') else 'image/png'
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                return {'mime_type': mime_type, 'data': image_file.read()}
         except Exception as e:
-            logger.error(f"Error encoding image {image_path}: {str(e)}")
+            logger.error(f"Error reading image {image_path}: {str(e)}")
             raise
-    
-    async def generate_initial_html(self, image_path: str, page_info: Dict) -> str:
+
+
+    @staticmethod
+    def _bytes_part(image_bytes: bytes) -> Dict[str, Any]:
+        """Build an inline request part from in-memory image bytes."""
+        mime_type = 'image/png' if image_bytes[:4] == b'\x89PNG' else 'image/jpeg'
+        return {'mime_type': mime_type, 'data': image_bytes}
+
+    def _prepare_image_part(self, image_path: str, display_name: str):
+        """
+        Prepare an image for a Gemini request.
+
+        Small images are passed inline with the request, avoiding the two
+        extra Files API round-trips (upload + delete) per page. Only images
+        above the inline limit go through the Files API.
+
+        Args:
+            image_path: Path to image file
+            display_name: Display name used if the Files API is needed
+
+        Returns:
+            Tuple of (request part, uploaded file or None)
+        """
+        if os.path.getsize(image_path) < _INLINE_IMAGE_LIMIT:
+            return self._load_inline_part(image_path), None
+
+        uploaded = genai.upload_file(path=image_path, display_name=display_name)
+        return uploaded, uploaded
+
+    async def _delete_uploads(self, *uploads) -> None:
+        """Delete any Files API uploads concurrently, off the event loop."""
+        deletes = [
+            asyncio.to_thread(genai.delete_file, upload.name)
+            for upload in uploads
+            if upload is not None
+        ]
+        if deletes:
+            await asyncio.gather(*deletes)
+
+
+    async def _generate_content(self, model, contents):
+        """
+        Run a blocking generate_content call in a worker thread.
+
+        Bounded by the GEMINI_CONCURRENCY semaphore so a large batch of
+        page tasks cannot pile up unbounded in-flight requests.
+        """
+        async with self._api_sem:
+            return await asyncio.to_thread(model.generate_content, contents)
+
+    async def generate_initial_html(
+        self,
+        image_path: Optional[str] = None,
+        page_info: Dict = None,
+        image_bytes: Optional[bytes] = None
+    ) -> str:
         """
         Generate initial HTML from a PDF page image.
         
         Args:
             image_path: Path to the page image
             page_info: Dictionary containing page metadata
+            image_bytes: In-memory encoded page image; when provided, the
+                image never touches disk
             
         Returns:
             Generated HTML string
         """
-        await self._rate_limit()
+        # Identical page images produce identical HTML; check the cache
+        # before spending rate-limit budget or an API call
+        cache_key = await asyncio.to_thread(
+            self._initial_html_cache_key, image_path, image_bytes
+        )
+        cached_html = await asyncio.to_thread(self._lookup_cached_html, cache_key)
+        if cached_html is not None:
+            logger.info(f"Initial HTML cache hit for page {page_info['page_number']}")
+            return cached_html
+
+        await self._limiter.acquire()
+        await self._ensure_prompt_caches()
         
         try:
-            # Prepare the image
-            image_file = genai.upload_file(path=image_path, display_name=f"PDF Page {page_info['page_number']}")
+            # Prepare the image (inline when small enough), off the loop
+            uploaded_file = None
+            if image_bytes is not None:
+                image_part = self._bytes_part(image_bytes)
+            else:
+                image_part, uploaded_file = await asyncio.to_thread(
+                    self._prepare_image_part,
+                    image_path, f"PDF Page {page_info['page_number']}"
+                )
             
-            # Initial generation prompt
-            prompt = f"""You are an expert frontend developer tasked with converting this PDF page image into accurate HTML5 and CSS code.
+            # Per-page delta; the static instructions live in the prompt cache
+            page_prompt = _INITIAL_PAGE_PROMPT.format_map(page_info)
 
-CRITICAL REQUIREMENTS:
-1. Analyze this image carefully and recreate it as HTML with embedded CSS
-2. Include ALL text content exactly as shown in the image
-3. Preserve the visual layout, fonts, colors, and spacing as closely as possible
-4. Use semantic HTML5 elements where appropriate
-5. Embed ALL CSS within a <style> tag in the <head>
-6. DO NOT use external libraries or frameworks
-7. Make the page responsive but prioritize exact visual matching
-8. Pay special attention to:
-   - Font families, sizes, and weights
-   - Colors and backgrounds
-   - Margins, padding, and spacing
-   - Text alignment and line heights
-   - Any images, graphics, or special formatting
-
-PAGE INFORMATION:
-- Page number: {page_info['page_number']}
-- Original dimensions: {page_info['width']}pt x {page_info['height']}pt
-- Image resolution: {page_info['pixel_width']}px x {page_info['pixel_height']}px
+            logger.info(f"Generating initial HTML for page {page_info['page_number']}")
 
-RESPONSE FORMAT:
-Return ONLY the complete HTML document, starting with <!DOCTYPE html> and ending with </html>. 
-Do not include any explanations or markdown formatting."""
+            # The SDK call is synchronous-blocking; run it in a thread so
+            # other page tasks keep progressing while this one is in flight
+            if self._initial_model is not None:
+                response = await self._generate_content(
+                    self._initial_model, [page_prompt, image_part]
+                )
+            else:
+                prompt = f"{_INITIAL_SYSTEM_PROMPT}\n\n{page_prompt}"
+                response = await self._generate_content(self.model, [prompt, image_part])
 
-            logger.info(f"Generating initial HTML for page {page_info['page_number']}")
-            
-            response = self.model.generate_content([prompt, image_file])
-            
             if not response.text:
                 raise Exception("Empty response from Gemini API")
+
+            # Clean up uploaded file (inline parts need no cleanup)
+            await self._delete_uploads(uploaded_file)
             
-            # Clean up uploaded file
-            genai.delete_file(image_file.name)
-            
+            html = response.text.strip()
+            # Persist off the loop; the write is pure bookkeeping
+            await asyncio.to_thread(self._store_cached_html, cache_key, html)
+
             logger.info(f"Successfully generated initial HTML for page {page_info['page_number']}")
-            return response.text.strip()
+            return html
             
         except Exception as e:
             logger.error(f"Error generating initial HTML for page {page_info['page_number']}: {str(e)}")
             raise Exception(f"Failed to generate HTML: {str(e)}")
     
+
+    async def generate_initial_html_batch(
+        self,
+        image_paths: Optional[List[str]] = None,
+        page_infos: List[Dict] = None,
+        images_bytes: Optional[List[bytes]] = None
+    ) -> List[str]:
+        """
+        Generate initial HTML for several PDF page images in one API call.
+
+        Sends all page images in a single request and asks the model to
+        delimit each document with a <!--PAGE n--> sentinel, amortizing the
+        fixed per-call overhead (TLS, auth, rate-limit gap) over the batch.
+        Cached pages are skipped, and the batch falls back to the
+        single-page path if the response cannot be split cleanly.
+
+        Args:
+            image_paths: Paths to the page images (at most a handful)
+            page_infos: Page metadata dictionaries, parallel to the images
+            images_bytes: In-memory encoded page images, as an alternative
+                to image_paths
+
+        Returns:
+            List of generated HTML strings, parallel to the input images
+        """
+        if images_bytes is not None:
+            sources = [(None, data) for data in images_bytes]
+        else:
+            sources = [(path, None) for path in image_paths]
+        if len(sources) != len(page_infos):
+            raise ValueError("images and page_infos must be the same length")
+        if len(sources) > _BATCH_SIZE_LIMIT:
+            raise ValueError(f"Batch size {len(sources)} exceeds limit of {_BATCH_SIZE_LIMIT}")
+
+        results: List[Optional[str]] = [None] * len(sources)
+
+        # Serve cached pages up front so only misses spend API budget
+        cache_keys = [
+            await asyncio.to_thread(self._initial_html_cache_key, path, data)
+            for path, data in sources
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached_html = await asyncio.to_thread(self._lookup_cached_html, cache_key)
+            if cached_html is not None:
+                logger.info(f"Initial HTML cache hit for page {page_infos[index]['page_number']}")
+                results[index] = cached_html
+            else:
+                pending.append(index)
+
+        if not pending:
+            return results
+
+        uploads = []
+        try:
+            await self._limiter.acquire()
+            await self._ensure_prompt_caches()
+
+            parts = []
+            metadata_lines = []
+            for position, index in enumerate(pending, start=1):
+                info = page_infos[index]
+                path, data = sources[index]
+                if data is not None:
+                    image_part, uploaded_file = self._bytes_part(data), None
+                else:
+                    image_part, uploaded_file = await asyncio.to_thread(
+                        self._prepare_image_part,
+                        path, f"PDF Page {info['page_number']}"
+                    )
+                parts.append(image_part)
+                uploads.append(uploaded_file)
+                metadata_lines.append(
+                    f"PAGE {position}: page number {info['page_number']}, "
+                    f"original dimensions {info['width']}pt x {info['height']}pt, "
+                    f"image resolution {info['pixel_width']}px x {info['pixel_height']}px"
+                )
+
+            batch_prompt = f"""You are given {len(pending)} page images, in order.
+{chr(10).join(metadata_lines)}
+
+Convert EACH page image to a complete standalone HTML document following the instructions above.
+Output the documents in the same order, each preceded by a sentinel comment on its own line:
+<!--PAGE 1-->
+<!DOCTYPE html>...</html>
+<!--PAGE 2-->
+<!DOCTYPE html>...</html>
+Do not output anything before the first sentinel or after the last document."""
+
+            logger.info(f"Generating initial HTML for {len(pending)} pages in one batch")
+
+            if self._initial_model is not None:
+                response = await self._generate_content(
+                    self._initial_model, [batch_prompt, *parts]
+                )
+            else:
+                prompt = f"{_INITIAL_SYSTEM_PROMPT}\n\n{batch_prompt}"
+                response = await self._generate_content(self.model, [prompt, *parts])
+
+            if not response.text:
+                raise Exception("Empty response from Gemini API")
+
+            documents = [
+                chunk.strip()
+                for chunk in _BATCH_SENTINEL_RE.split(response.text)[::2]
+                if chunk.strip()
+            ]
+            if len(documents) != len(pending):
+                raise Exception(
+                    f"Expected {len(pending)} documents in batch response, got {len(documents)}"
+                )
+
+            for index, html in zip(pending, documents):
+                results[index] = html
+                await asyncio.to_thread(self._store_cached_html, cache_keys[index], html)
+
+            logger.info(f"Successfully generated batch of {len(pending)} pages")
+            return results
+
+        except Exception as e:
+            logger.warning(f"Batch generation failed, falling back to per-page calls: {str(e)}")
+            fallbacks = await asyncio.gather(*[
+                self.generate_initial_html(
+                    sources[index][0], page_infos[index], image_bytes=sources[index][1]
+                )
+                for index in pending
+            ])
+            for index, html in zip(pending, fallbacks):
+                results[index] = html
+            return results
+        finally:
+            await self._delete_uploads(*uploads)
+
     async def refine_html(
-        self, 
-        original_image_path: str, 
-        current_html: str, 
-        screenshot_path: str,
-        page_info: Dict,
-        iteration: int = 1
+        self,
+        original_image_path: Optional[str] = None,
+        current_html: str = None,
+        screenshot_path: Optional[str] = None,
+        page_info: Dict = None,
+        iteration: int = 1,
+        screenshot_bytes: Optional[bytes] = None,
+        original_image_bytes: Optional[bytes] = None,
+        cache_name: Optional[str] = None
     ) -> str:
         """
         Refine HTML by comparing original image with current rendering.
-        
+
         Args:
             original_image_path: Path to original PDF page image
             current_html: Current HTML code to be refined
             screenshot_path: Path to screenshot of current HTML rendering
             page_info: Dictionary containing page metadata
             iteration: Current refinement iteration number
-            
+            screenshot_bytes: In-memory JPEG of the current rendering; when
+                provided, the screenshot never touches disk
+            original_image_bytes: In-memory encoded original page image
+            cache_name: Per-page cache from create_page_cache; when set,
+                the original image is served from the cache and not re-sent
+
         Returns:
             Refined HTML string
         """
-        await self._rate_limit()
-        
-        try:
-            # Upload both images
-            original_image = genai.upload_file(path=original_image_path, display_name=f"Original Page {page_info['page_number']}")
-            screenshot_image = genai.upload_file(path=screenshot_path, display_name=f"Current Rendering Page {page_info['page_number']}")
-            
-            # Refinement prompt
-            prompt = f"""You are a visual quality control system for frontend development. Your task is to perfect HTML code by comparing its rendered output with a target image.
-
-INPUTS PROVIDED:
-1. TARGET IMAGE: The original PDF page that we want to recreate perfectly
-2. CURRENT RENDERING: Screenshot of how the current HTML code looks when rendered
-3. CURRENT HTML CODE: The code that produced the current rendering
-
-YOUR MISSION:
-Analyze the visual differences between the TARGET IMAGE and CURRENT RENDERING, then modify the HTML code to eliminate these differences.
-
-ANALYSIS FOCUS:
-- Text content accuracy and completeness
-- Font families, sizes, weights, and styles
-- Colors (text, backgrounds, borders)
-- Layout and positioning
-- Spacing (margins, padding, line-height)
-- Element alignment and justification  
-- Missing or incorrectly positioned elements
-- Overall visual hierarchy and structure
+        await self._limiter.acquire()
+        await self._ensure_prompt_caches()
 
-REFINEMENT GUIDELINES:
-1. Fix ANY visual discrepancies you identify
-2. Maintain the existing HTML structure if it's working well
-3. Adjust CSS properties to match the target image exactly
-4. Add missing content or elements if they exist in target but not current rendering
-5. Correct any text that doesn't match exactly
-6. Ensure colors, fonts, and spacing are pixel-perfect when possible
+        try:
+            # The per-page cache already holds the original image; only
+            # the latest screenshot travels with the request
+            page_model = self._page_cache_models.get(cache_name) if cache_name else None
+            if page_model is not None and screenshot_bytes is not None:
+                page_prompt = _REFINE_PAGE_PROMPT.format_map(
+                    {**page_info, 'iteration': iteration, 'current_html': current_html}
+                )
+                logger.info(f"Refining HTML for page {page_info['page_number']}, iteration {iteration} (cached image)")
+                response = await self._generate_content(
+                    page_model,
+                    [page_prompt, {'mime_type': 'image/jpeg', 'data': screenshot_bytes}]
+                )
+                if not response.text:
+                    raise Exception("Empty response from Gemini API during refinement")
+                logger.info(f"Successfully refined HTML for page {page_info['page_number']}, iteration {iteration}")
+                return response.text.strip()
 
-PAGE INFORMATION:
-- Page: {page_info['page_number']}
-- Refinement iteration: {iteration}
-- Target dimensions: {page_info['width']}pt x {page_info['height']}pt
+            # Prepare both images concurrently (inline when small enough)
+            screenshot_upload = None
+            original_upload = None
+            if original_image_bytes is not None and screenshot_bytes is not None:
+                original_part = self._bytes_part(original_image_bytes)
+                screenshot_part = {'mime_type': 'image/jpeg', 'data': screenshot_bytes}
+            elif screenshot_bytes is not None:
+                screenshot_part = {'mime_type': 'image/jpeg', 'data': screenshot_bytes}
+                original_part, original_upload = await asyncio.to_thread(
+                    self._prepare_image_part,
+                    original_image_path, f"Original Page {page_info['page_number']}"
+                )
+            else:
+                (original_part, original_upload), (screenshot_part, screenshot_upload) = await asyncio.gather(
+                    asyncio.to_thread(
+                        self._prepare_image_part,
+                        original_image_path, f"Original Page {page_info['page_number']}"
+                    ),
+                    asyncio.to_thread(
+                        self._prepare_image_part,
+                        screenshot_path, f"Current Rendering Page {page_info['page_number']}"
+                    )
+                )
+            
+            # Per-call delta; the static instructions live in the prompt cache
+            page_prompt = _REFINE_PAGE_PROMPT.format_map(
+                {**page_info, 'iteration': iteration, 'current_html': current_html}
+            )
 
-CURRENT HTML CODE:
-{current_html}
+            logger.info(f"Refining HTML for page {page_info['page_number']}, iteration {iteration}")
 
-RESPONSE FORMAT:
-Return ONLY the improved HTML code. Start with <!DOCTYPE html> and end with </html>.
-Do not include explanations, comments, or markdown formatting."""
+            if self._refine_model is not None:
+                response = await self._generate_content(
+                    self._refine_model, [page_prompt, original_part, screenshot_part]
+                )
+            else:
+                prompt = f"{_REFINE_SYSTEM_PROMPT}\n\n{page_prompt}"
+                response = await self._generate_content(
+                    self.model, [prompt, original_part, screenshot_part]
+                )
 
-            logger.info(f"Refining HTML for page {page_info['page_number']}, iteration {iteration}")
-            
-            response = self.model.generate_content([prompt, original_image, screenshot_image])
-            
             if not response.text:
                 raise Exception("Empty response from Gemini API during refinement")
-            
-            # Clean up uploaded files
-            genai.delete_file(original_image.name)
-            genai.delete_file(screenshot_image.name)
-            
+
+            # Clean up uploaded files concurrently (inline parts need no cleanup)
+            await self._delete_uploads(original_upload, screenshot_upload)
+
             logger.info(f"Successfully refined HTML for page {page_info['page_number']}, iteration {iteration}")
             return response.text.strip()
             
@@ -224,59 +812,84 @@ Do not include explanations, comments, or markdown formatting."""
             raise Exception(f"Failed to refine HTML: {str(e)}")
     
     async def analyze_visual_similarity(
-        self, 
-        original_image_path: str, 
-        screenshot_path: str
+        self,
+        original_image_path: Optional[str] = None,
+        screenshot_path: Optional[str] = None,
+        screenshot_bytes: Optional[bytes] = None,
+        original_image_bytes: Optional[bytes] = None,
+        cache_name: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Analyze visual similarity between original and rendered images.
         This is an optional feature for advanced quality assessment.
-        
+
         Args:
             original_image_path: Path to original PDF page image
             screenshot_path: Path to screenshot of rendered HTML
-            
+            screenshot_bytes: In-memory JPEG of the rendered HTML
+            original_image_bytes: In-memory encoded original page image
+            cache_name: Per-page cache from create_page_cache; when set,
+                the original image is served from the cache and not re-sent
+
         Returns:
             Dictionary with similarity analysis results
         """
-        await self._rate_limit()
-        
-        try:
-            # Upload both images
-            original_image = genai.upload_file(path=original_image_path, display_name="Original")
-            screenshot_image = genai.upload_file(path=screenshot_path, display_name="Rendered")
-            
-            prompt = """Compare these two images and provide a detailed analysis of their visual similarity.
+        await self._limiter.acquire()
 
-Analyze and rate (1-10 scale) the following aspects:
-1. Text content accuracy and completeness
-2. Layout and positioning similarity
-3. Color accuracy
-4. Font and typography matching
-5. Overall visual fidelity
-
-Provide a JSON response with:
-- overall_score: number (1-10, where 10 is perfect match)
-- text_accuracy: number (1-10)
-- layout_similarity: number (1-10) 
-- color_accuracy: number (1-10)
-- typography_match: number (1-10)
-- major_differences: array of strings describing key differences
-- recommendations: array of strings with improvement suggestions
-
-Return only valid JSON, no other text."""
+        try:
+            # Serve the original image from the per-page cache when possible
+            page_model = self._page_cache_models.get(cache_name) if cache_name else None
+            if page_model is not None and screenshot_bytes is not None:
+                response = await self._generate_content(
+                    page_model,
+                    [_SIMILARITY_PROMPT, {'mime_type': 'image/jpeg', 'data': screenshot_bytes}]
+                )
+                text = _JSON_FENCE_RE.sub('', response.text.strip()).strip()
+                try:
+                    return SimilarityReport(**orjson.loads(text)).model_dump()
+                except Exception:
+                    # Fallback if JSON parsing or validation fails
+                    return {
+                        "overall_score": 7,
+                        "text_accuracy": 7,
+                        "layout_similarity": 7,
+                        "color_accuracy": 7,
+                        "typography_match": 7,
+                        "major_differences": ["Unable to analyze"],
+                        "recommendations": ["Manual review recommended"]
+                    }
 
-            response = self.model.generate_content([prompt, original_image, screenshot_image])
+            # Prepare both images concurrently (inline when small enough)
+            screenshot_upload = None
+            original_upload = None
+            if original_image_bytes is not None and screenshot_bytes is not None:
+                original_part = self._bytes_part(original_image_bytes)
+                screenshot_part = {'mime_type': 'image/jpeg', 'data': screenshot_bytes}
+            elif screenshot_bytes is not None:
+                screenshot_part = {'mime_type': 'image/jpeg', 'data': screenshot_bytes}
+                original_part, original_upload = await asyncio.to_thread(
+                    self._prepare_image_part, original_image_path, "Original"
+                )
+            else:
+                (original_part, original_upload), (screenshot_part, screenshot_upload) = await asyncio.gather(
+                    asyncio.to_thread(self._prepare_image_part, original_image_path, "Original"),
+                    asyncio.to_thread(self._prepare_image_part, screenshot_path, "Rendered")
+                )
             
-            # Clean up uploaded files
-            genai.delete_file(original_image.name)
-            genai.delete_file(screenshot_image.name)
+            response = await self._generate_content(
+                self.model, [_SIMILARITY_PROMPT, original_part, screenshot_part]
+            )
+
+            # Clean up uploaded files concurrently (inline parts need no cleanup)
+            await self._delete_uploads(original_upload, screenshot_upload)
             
+            # Strip markdown fences before parsing so the happy path does
+            # not fall through to defaults
+            text = _JSON_FENCE_RE.sub('', response.text.strip()).strip()
             try:
-                import json
-                return json.loads(response.text.strip())
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
+                return SimilarityReport(**orjson.loads(text)).model_dump()
+            except Exception:
+                # Fallback if JSON parsing or validation fails
                 return {
                     "overall_score": 7,
                     "text_accuracy": 7,
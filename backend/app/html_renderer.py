@@ -5,38 +5,114 @@ Uses Playwright to render HTML in a headless browser and take screenshots.
 Optimized for accurate visual comparison with original PDF pages.
 """
 
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import async_playwright, BrowserContext, Page
 import asyncio
+import atexit
+import hashlib
 import uuid
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from pathlib import Path
 import logging
 import base64
 
 logger = logging.getLogger(__name__)
 
+# Version prefix for cached renderings. Bump whenever rendering behavior
+# changes (viewport logic, waits, screenshot settings) so stale entries
+# are invalidated wholesale.
+_RENDER_CACHE_VERSION = 'v2'
+
+# JavaScript snippet returning the full rendered document dimensions
+_DIMENSIONS_JS = """
+    () => {
+        return {
+            width: Math.max(
+                document.body.scrollWidth,
+                document.body.offsetWidth,
+                document.documentElement.clientWidth,
+                document.documentElement.scrollWidth,
+                document.documentElement.offsetWidth
+            ),
+            height: Math.max(
+                document.body.scrollHeight,
+                document.body.offsetHeight,
+                document.documentElement.clientHeight,
+                document.documentElement.scrollHeight,
+                document.documentElement.offsetHeight
+            )
+        }
+    }
+"""
+
+# Process-wide renderer shared by the module-level convenience functions so
+# Chromium is launched once, not once per call
+_shared_renderer: Optional["HTMLRenderer"] = None
+_shared_renderer_lock: Optional[asyncio.Lock] = None
+
+
+def _shutdown_shared_renderer() -> None:
+    """Best-effort shutdown of the shared browser at interpreter exit."""
+    global _shared_renderer
+    renderer = _shared_renderer
+    _shared_renderer = None
+    if renderer is not None:
+        try:
+            asyncio.run(renderer.stop_browser())
+        except Exception as e:
+            logger.warning(f"Error shutting down shared renderer: {str(e)}")
+
 
 class HTMLRenderer:
     """
     Renders HTML content using Playwright and captures screenshots for comparison.
     """
     
-    def __init__(self, screenshots_dir: str = "./screenshots", headless: bool = True):
+    def __init__(self, screenshots_dir: str = "./screenshots", headless: bool = True, pool_size: Optional[int] = None):
         """
         Initialize HTML renderer.
-        
+
         Args:
             screenshots_dir: Directory to save screenshots
             headless: Run browser in headless mode
+            pool_size: Number of pre-warmed pages kept for concurrent
+                renders; doubles as the in-flight render cap. Defaults to
+                the RENDER_CONCURRENCY env var (4).
         """
         self.screenshots_dir = Path(screenshots_dir)
         self.screenshots_dir.mkdir(exist_ok=True, parents=True)
         self.headless = headless
-        self.browser: Optional[Browser] = None
+        # The bounded page pool is also the render concurrency limit: a
+        # render cannot start until it checks a page out of the queue
+        self.pool_size = pool_size or int(os.getenv('RENDER_CONCURRENCY', '4'))
         self.context: Optional[BrowserContext] = None
         self.playwright = None
+        self._page_pool: Optional[asyncio.Queue] = None
         
+    @classmethod
+    async def get_shared(cls, screenshots_dir: str = "./screenshots") -> "HTMLRenderer":
+        """
+        Get the process-wide shared renderer, starting its browser on first use.
+
+        Args:
+            screenshots_dir: Directory to save screenshots (first call wins)
+
+        Returns:
+            The shared HTMLRenderer instance with a running browser
+        """
+        global _shared_renderer, _shared_renderer_lock
+        if _shared_renderer_lock is None:
+            _shared_renderer_lock = asyncio.Lock()
+
+        async with _shared_renderer_lock:
+            if _shared_renderer is None:
+                renderer = cls(screenshots_dir)
+                await renderer.start_browser()
+                atexit.register(_shutdown_shared_renderer)
+                _shared_renderer = renderer
+
+        return _shared_renderer
+
     async def __aenter__(self):
         """Async context manager entry."""
         await self.start_browser()
@@ -51,9 +127,14 @@ class HTMLRenderer:
         try:
             self.playwright = await async_playwright().start()
             
-            # Use Chromium for consistency
-            self.browser = await self.playwright.chromium.launch(
+            # Persistent profile lets later runs reuse Chromium's font and
+            # Skia shader caches instead of warming them from scratch
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                user_data_dir=str(self.screenshots_dir / 'chrome-profile'),
                 headless=self.headless,
+                viewport={'width': 1200, 'height': 800},
+                device_scale_factor=1,
+                ignore_https_errors=True,
                 args=[
                     '--no-sandbox',
                     '--disable-setuid-sandbox',
@@ -61,34 +142,61 @@ class HTMLRenderer:
                     '--disable-gpu',
                     '--no-first-run',
                     '--no-default-browser-check',
-                    '--disable-extensions'
+                    '--disable-extensions',
+                    '--disable-features=Translate,BackForwardCache,AcceptCHFrame',
+                    '--disable-background-networking',
+                    '--disable-sync',
+                    '--mute-audio',
+                    '--disable-ipc-flooding-protection',
+                    '--font-render-hinting=none'
                 ]
             )
-            
-            # Create browser context with specific viewport
-            self.context = await self.browser.new_context(
-                viewport={'width': 1200, 'height': 800},
-                device_scale_factor=1,
-                ignore_https_errors=True
-            )
-            
+
+            # Pre-warm a bounded pool of pages so concurrent renders skip
+            # per-call page creation
+            self._page_pool = asyncio.Queue(maxsize=self.pool_size)
+            for _ in range(self.pool_size):
+                self._page_pool.put_nowait(await self.context.new_page())
+
             logger.info("Playwright browser started successfully")
             
         except Exception as e:
             logger.error(f"Failed to start browser: {str(e)}")
             raise Exception(f"Browser startup failed: {str(e)}")
     
+    async def _acquire_page(self) -> Page:
+        """Check a page out of the pre-warmed pool."""
+        if self._page_pool is None:
+            raise Exception("Browser not started. Use async context manager or call start_browser()")
+        return await self._page_pool.get()
+
+    async def _release_page(self, page: Page) -> None:
+        """Reset a page and return it to the pool."""
+        try:
+            await page.goto('about:blank')
+            await self._page_pool.put(page)
+        except Exception:
+            # Replace a broken page so the pool does not shrink
+            try:
+                await self._page_pool.put(await self.context.new_page())
+            except Exception as e:
+                logger.warning(f"Failed to replace pooled page: {str(e)}")
+
     async def stop_browser(self) -> None:
         """Stop the Playwright browser."""
         try:
+            if self._page_pool is not None:
+                while not self._page_pool.empty():
+                    try:
+                        await self._page_pool.get_nowait().close()
+                    except Exception:
+                        pass
+                self._page_pool = None
+
             if self.context:
                 await self.context.close()
                 self.context = None
             
-            if self.browser:
-                await self.browser.close()
-                self.browser = None
-                
             if self.playwright:
                 await self.playwright.stop()
                 self.playwright = None
@@ -102,8 +210,7 @@ class HTMLRenderer:
         self, 
         html_content: str, 
         page_info: Dict, 
-        wait_for_load: int = 2000,
-        full_page: bool = True
+        full_page: bool = False
     ) -> str:
         """
         Render HTML content and take a screenshot.
@@ -111,59 +218,213 @@ class HTMLRenderer:
         Args:
             html_content: HTML content to render
             page_info: Page metadata dictionary
-            wait_for_load: Milliseconds to wait for page load
-            full_page: Whether to capture full page or viewport only
+            full_page: Capture the full scrollable page instead of a clip
+                of the viewport (slower; Chromium stitches tiles)
             
         Returns:
             Path to the screenshot file
         """
-        if not self.browser or not self.context:
+        if not self.context:
             raise Exception("Browser not started. Use async context manager or call start_browser()")
-        
+
+        # Resolve viewport up front so it can be part of the cache key
+        viewport = None
+        if page_info.get('pixel_width') and page_info.get('pixel_height'):
+            viewport = {
+                'width': int(min(page_info['pixel_width'], 1920)),  # Cap at reasonable size
+                'height': int(min(page_info['pixel_height'], 1080))
+            }
+
+        # Content-addressed cache: identical HTML rendered at the same
+        # viewport produces the same screenshot, so repeats skip Chromium
+        cache_key = hashlib.blake2b(
+            html_content.encode() + f"{_RENDER_CACHE_VERSION}:{viewport}:{full_page}".encode(),
+            digest_size=16
+        ).hexdigest()
+        screenshot_path = self.screenshots_dir / f"cache_{cache_key}.jpg"
+        if screenshot_path.exists():
+            logger.debug(f"Screenshot cache hit: {screenshot_path}")
+            return str(screenshot_path)
+
         page = None
         try:
-            # Create a new page
-            page = await self.context.new_page()
+            # Check out a pooled page
+            page = await self._acquire_page()
+
+            if viewport is not None:
+                await page.set_viewport_size(viewport)
+
+            logger.info(f"Rendering HTML for page {page_info.get('page_number', 'unknown')}")
+
+            # Load HTML content; generated pages embed all CSS inline and
+            # load no external resources, so DOM-ready is sufficient
+            await page.set_content(html_content, wait_until='domcontentloaded')
+
+            # Block only until fonts are available
+            await page.evaluate('document.fonts.ready')
+
+            # Clipped capture avoids Chromium's multi-tile full-page path
+            clip = None
+            if not full_page and viewport is not None:
+                clip = {'x': 0, 'y': 0, 'width': viewport['width'], 'height': viewport['height']}
+
+            await page.screenshot(
+                path=str(screenshot_path),
+                full_page=full_page,
+                clip=clip,
+                type='jpeg',
+                quality=92
+            )
             
+            logger.info(f"Screenshot saved: {screenshot_path}")
+            
+            return str(screenshot_path)
+            
+        except Exception as e:
+            logger.error(f"Error rendering HTML for page {page_info.get('page_number', 'unknown')}: {str(e)}")
+            raise Exception(f"Failed to render HTML: {str(e)}")
+        finally:
+            if page:
+                await self._release_page(page)
+
+    async def measure_and_capture(
+        self,
+        html_content: str,
+        page_info: Dict,
+        full_page: bool = False
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Render HTML once, measure its dimensions, and take a screenshot.
+
+        Fuses get_page_dimensions and render_and_screenshot into a single
+        page load so the content is only set and laid out once per call.
+
+        Args:
+            html_content: HTML content to render
+            page_info: Page metadata dictionary
+            full_page: Whether to capture full page or viewport only
+
+        Returns:
+            Tuple of (screenshot path, rendered dimensions dict)
+        """
+        if not self.context:
+            raise Exception("Browser not started. Use async context manager or call start_browser()")
+
+        page = None
+        try:
+            page = await self._acquire_page()
+
             # Set viewport size based on page dimensions if provided
             if page_info.get('pixel_width') and page_info.get('pixel_height'):
-                viewport_width = min(page_info['pixel_width'], 1920)  # Cap at reasonable size
-                viewport_height = min(page_info['pixel_height'], 1080)
                 await page.set_viewport_size({
-                    'width': int(viewport_width),
-                    'height': int(viewport_height)
+                    'width': int(min(page_info['pixel_width'], 1920)),
+                    'height': int(min(page_info['pixel_height'], 1080))
                 })
-            
+
             logger.info(f"Rendering HTML for page {page_info.get('page_number', 'unknown')}")
-            
-            # Load HTML content
-            await page.set_content(html_content, wait_until='networkidle')
-            
-            # Additional wait for any dynamic content
-            await page.wait_for_timeout(wait_for_load)
-            
-            # Generate unique filename
-            screenshot_filename = f"screenshot_{page_info.get('page_number', 'unknown')}_{uuid.uuid4().hex}.png"
+
+            await page.set_content(html_content, wait_until='domcontentloaded')
+            await page.evaluate('document.fonts.ready')
+
+            # Measure on the already-loaded document
+            dimensions = await page.evaluate(_DIMENSIONS_JS)
+            dims = {
+                'width': int(dimensions['width']),
+                'height': int(dimensions['height'])
+            }
+
+            screenshot_filename = f"screenshot_{page_info.get('page_number', 'unknown')}_{uuid.uuid4().hex}.jpg"
             screenshot_path = self.screenshots_dir / screenshot_filename
-            
-            # Take screenshot
+
+            # Clip to the measured content size instead of full-page capture
+            clip = None
+            if not full_page:
+                clip = {'x': 0, 'y': 0, 'width': dims['width'], 'height': dims['height']}
+
             await page.screenshot(
                 path=str(screenshot_path),
                 full_page=full_page,
-                type='png'
+                clip=clip,
+                type='jpeg',
+                quality=92
             )
-            
-            logger.info(f"Screenshot saved: {screenshot_path}")
-            
-            return str(screenshot_path)
-            
+
+            logger.info(f"Screenshot saved: {screenshot_path} ({dims['width']}x{dims['height']}px)")
+
+            return str(screenshot_path), dims
+
         except Exception as e:
             logger.error(f"Error rendering HTML for page {page_info.get('page_number', 'unknown')}: {str(e)}")
             raise Exception(f"Failed to render HTML: {str(e)}")
         finally:
             if page:
-                await page.close()
-    
+                await self._release_page(page)
+
+    async def screenshot_bytes(
+        self,
+        html_content: str,
+        page_info: Dict,
+        full_page: bool = False
+    ) -> Tuple[bytes, Dict[str, int]]:
+        """
+        Render HTML and return the screenshot as in-memory JPEG bytes.
+
+        Skips the filesystem entirely for ephemeral screenshots (e.g. the
+        refinement loop), so there is no file write, re-read, or later
+        cleanup unlink per iteration.
+
+        Args:
+            html_content: HTML content to render
+            page_info: Page metadata dictionary
+            full_page: Whether to capture full page or viewport only
+
+        Returns:
+            Tuple of (JPEG bytes, rendered dimensions dict)
+        """
+        if not self.context:
+            raise Exception("Browser not started. Use async context manager or call start_browser()")
+
+        page = None
+        try:
+            page = await self._acquire_page()
+
+            if page_info.get('pixel_width') and page_info.get('pixel_height'):
+                await page.set_viewport_size({
+                    'width': int(min(page_info['pixel_width'], 1920)),
+                    'height': int(min(page_info['pixel_height'], 1080))
+                })
+
+            logger.info(f"Rendering HTML for page {page_info.get('page_number', 'unknown')}")
+
+            await page.set_content(html_content, wait_until='domcontentloaded')
+            await page.evaluate('document.fonts.ready')
+
+            dimensions = await page.evaluate(_DIMENSIONS_JS)
+            dims = {
+                'width': int(dimensions['width']),
+                'height': int(dimensions['height'])
+            }
+
+            # Clip to the measured content size instead of full-page capture
+            clip = None
+            if not full_page:
+                clip = {'x': 0, 'y': 0, 'width': dims['width'], 'height': dims['height']}
+
+            # No path argument: Playwright returns the encoded bytes.
+            # JPEG encodes much faster than PNG in Chromium and is several
+            # times smaller, which also shrinks the Gemini payload; the
+            # comparison pass does not need lossless output.
+            image = await page.screenshot(full_page=full_page, clip=clip, type='jpeg', quality=92)
+
+            return image, dims
+
+        except Exception as e:
+            logger.error(f"Error rendering HTML for page {page_info.get('page_number', 'unknown')}: {str(e)}")
+            raise Exception(f"Failed to render HTML: {str(e)}")
+        finally:
+            if page:
+                await self._release_page(page)
+
     async def compare_with_target_size(
         self, 
         html_content: str, 
@@ -183,31 +444,32 @@ class HTMLRenderer:
         Returns:
             Path to the screenshot file
         """
-        if not self.browser or not self.context:
+        if not self.context:
             raise Exception("Browser not started. Use async context manager or call start_browser()")
         
         page = None
         try:
-            # Create a new page with exact target dimensions
-            page = await self.context.new_page()
+            # Check out a pooled page and set exact target dimensions
+            page = await self._acquire_page()
             await page.set_viewport_size({
                 'width': target_width,
                 'height': target_height
             })
             
             # Load HTML content
-            await page.set_content(html_content, wait_until='networkidle')
-            await page.wait_for_timeout(2000)
+            await page.set_content(html_content, wait_until='domcontentloaded')
+            await page.evaluate('document.fonts.ready')
             
             # Generate filename
-            screenshot_filename = f"comparison_{page_number}_{target_width}x{target_height}_{uuid.uuid4().hex}.png"
+            screenshot_filename = f"comparison_{page_number}_{target_width}x{target_height}_{uuid.uuid4().hex}.jpg"
             screenshot_path = self.screenshots_dir / screenshot_filename
             
             # Take screenshot with exact dimensions
             await page.screenshot(
                 path=str(screenshot_path),
                 full_page=False,  # Use viewport size
-                type='png'
+                type='jpeg',
+                quality=92
             )
             
             logger.info(f"Comparison screenshot saved: {screenshot_path}")
@@ -218,7 +480,7 @@ class HTMLRenderer:
             raise Exception(f"Failed to render for comparison: {str(e)}")
         finally:
             if page:
-                await page.close()
+                await self._release_page(page)
     
     async def get_page_dimensions(self, html_content: str) -> Dict[str, int]:
         """
@@ -230,36 +492,17 @@ class HTMLRenderer:
         Returns:
             Dictionary with width and height of rendered content
         """
-        if not self.browser or not self.context:
+        if not self.context:
             raise Exception("Browser not started. Use async context manager or call start_browser()")
         
         page = None
         try:
-            page = await self.context.new_page()
-            await page.set_content(html_content, wait_until='networkidle')
-            await page.wait_for_timeout(1000)
+            page = await self._acquire_page()
+            await page.set_content(html_content, wait_until='domcontentloaded')
+            await page.evaluate('document.fonts.ready')
             
             # Get document dimensions
-            dimensions = await page.evaluate("""
-                () => {
-                    return {
-                        width: Math.max(
-                            document.body.scrollWidth,
-                            document.body.offsetWidth,
-                            document.documentElement.clientWidth,
-                            document.documentElement.scrollWidth,
-                            document.documentElement.offsetWidth
-                        ),
-                        height: Math.max(
-                            document.body.scrollHeight,
-                            document.body.offsetHeight,
-                            document.documentElement.clientHeight,
-                            document.documentElement.scrollHeight,
-                            document.documentElement.offsetHeight
-                        )
-                    }
-                }
-            """)
+            dimensions = await page.evaluate(_DIMENSIONS_JS)
             
             return {
                 'width': int(dimensions['width']),
@@ -271,7 +514,7 @@ class HTMLRenderer:
             return {'width': 800, 'height': 600}  # Default fallback
         finally:
             if page:
-                await page.close()
+                await self._release_page(page)
     
     def cleanup_screenshot(self, screenshot_path: str) -> None:
         """
@@ -288,12 +531,22 @@ class HTMLRenderer:
         except Exception as e:
             logger.warning(f"Could not clean up screenshot {screenshot_path}: {str(e)}")
     
-    def cleanup_all_screenshots(self) -> None:
+    def _sync_cleanup_screenshots(self) -> None:
+        """Unlink every screenshot in the screenshots directory (blocking)."""
+        # os.scandir + os.unlink avoids a Path allocation and extra stat
+        # per entry, which adds up over thousands of screenshots
+        with os.scandir(self.screenshots_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(('.png', '.jpg')):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError as e:
+                        logger.warning(f"Could not clean up screenshot {entry.path}: {str(e)}")
+
+    async def cleanup_all_screenshots(self) -> None:
         """Clean up all screenshot files in the screenshots directory."""
         try:
-            for screenshot_file in self.screenshots_dir.glob("*.png"):
-                screenshot_file.unlink()
-                logger.debug(f"Cleaned up screenshot: {screenshot_file}")
+            await asyncio.to_thread(self._sync_cleanup_screenshots)
             logger.info("All screenshots cleaned up")
         except Exception as e:
             logger.warning(f"Error cleaning up screenshots: {str(e)}")
@@ -316,8 +569,8 @@ async def render_html_to_screenshot(
     Returns:
         Path to screenshot file
     """
-    async with HTMLRenderer(screenshots_dir) as renderer:
-        return await renderer.render_and_screenshot(html_content, page_info)
+    renderer = await HTMLRenderer.get_shared(screenshots_dir)
+    return await renderer.render_and_screenshot(html_content, page_info)
 
 
 async def get_html_dimensions(html_content: str) -> Dict[str, int]:
@@ -330,8 +583,8 @@ async def get_html_dimensions(html_content: str) -> Dict[str, int]:
     Returns:
         Dictionary with width and height
     """
-    async with HTMLRenderer() as renderer:
-        return await renderer.get_page_dimensions(html_content)
+    renderer = await HTMLRenderer.get_shared()
+    return await renderer.get_page_dimensions(html_content)
 
 
 async def render_for_comparison(
@@ -354,7 +607,7 @@ async def render_for_comparison(
     Returns:
         Path to screenshot file
     """
-    async with HTMLRenderer(screenshots_dir) as renderer:
-        return await renderer.compare_with_target_size(
-            html_content, target_width, target_height, page_number
-        )
+    renderer = await HTMLRenderer.get_shared(screenshots_dir)
+    return await renderer.compare_with_target_size(
+        html_content, target_width, target_height, page_number
+    )
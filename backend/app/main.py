@@ -7,27 +7,31 @@ Main FastAPI application with endpoints for PDF upload, WebSocket communication,
 
 import asyncio
 import os
+import time
 import uuid
 import logging
-import json
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
 from pathlib import Path
-import tempfile
-import shutil
+
+import aiofiles
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-import uvicorn
-from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, Response
 
-from .refinement_engine import RefinementEngine
 from .websocket_manager import websocket_manager, create_progress_callback, notify_task_completion, notify_error
 from .pdf_processor import PDFProcessor
 
-# Load environment variables
-load_dotenv()
+# Keep-alive acknowledgment frame; only the timestamp varies, so the JSON
+# is prebuilt once and the microsecond count formatted in per message
+_ACK_TEMPLATE = b'{"type":"acknowledgment","message":"Message received","timestamp_us":%d}'
+
+# Load environment variables from .env outside production, where
+# configuration comes from the real environment
+if os.getenv("ENV") != "prod":
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # Configure logging
 logging.basicConfig(
@@ -42,13 +46,19 @@ app = FastAPI(
     description="Advanced PDF to HTML converter with AI-powered iterative refinement using screenshots",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
+# Configure CORS. An explicit origin list lets Starlette use its
+# set-membership fast path; wildcard is dev-only
+allowed_origins = ["http://localhost:3000", "http://localhost:5173"]  # Add frontend URLs
+if os.getenv("DEV") == "1":
+    allowed_origins.append("*")
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://localhost:5173", "*"],  # Add frontend URLs
+    allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
@@ -65,17 +75,73 @@ MAX_REFINEMENT_ITERATIONS = int(os.getenv("MAX_REFINEMENT_ITERATIONS", 2))
 for directory in [UPLOAD_DIR, TEMP_DIR, SCREENSHOTS_DIR]:
     directory.mkdir(exist_ok=True, parents=True)
 
+# How long finished task records are kept and how often expiry runs
+TASK_TTL_SECONDS = 86400  # 24 hours
+TASK_SWEEP_INTERVAL = 3600
+TASK_STORE_MAX = int(os.getenv("TASK_STORE_MAX", 1024))
+
+
+class TaskResultStore:
+    """
+    Bounded in-memory store for conversion task records.
+
+    Keeps at most max_entries records, evicting the oldest on insert, and
+    exposes a TTL sweep so completed tasks (and their encoded HTML) do not
+    accumulate until the process runs out of memory.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = TASK_TTL_SECONDS):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def __getitem__(self, task_id: str) -> Dict[str, Any]:
+        return self._entries[task_id]
+
+    def __setitem__(self, task_id: str, record: Dict[str, Any]) -> None:
+        self._entries[task_id] = record
+        self._entries.move_to_end(task_id)
+        while len(self._entries) > self.max_entries:
+            evicted_id, _ = self._entries.popitem(last=False)
+            logger.info(f"Evicted oldest task record: {evicted_id}")
+
+    def __delitem__(self, task_id: str) -> None:
+        del self._entries[task_id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self):
+        return self._entries.items()
+
+    def sweep_expired(self, current_time: float) -> List[str]:
+        """Remove records older than the TTL; returns the evicted task ids."""
+        expired = [
+            task_id for task_id, record in self._entries.items()
+            if current_time - record["created_at"] > self.ttl_seconds
+        ]
+        for task_id in expired:
+            del self._entries[task_id]
+        return expired
+
+
 # Global storage for conversion results
-conversion_results: Dict[str, Dict[str, Any]] = {}
+conversion_results = TaskResultStore(max_entries=TASK_STORE_MAX)
 
 # Initialize refinement engine
 refinement_engine = None
 
 
-async def get_refinement_engine() -> RefinementEngine:
+async def get_refinement_engine() -> "RefinementEngine":
     """Get or create refinement engine instance."""
     global refinement_engine
     if refinement_engine is None:
+        # Imported lazily: the engine drags in google-generativeai and
+        # Playwright, which should not be paid at app import time
+        from .refinement_engine import RefinementEngine
         refinement_engine = RefinementEngine(
             temp_dir=str(TEMP_DIR),
             screenshots_dir=str(SCREENSHOTS_DIR),
@@ -135,25 +201,39 @@ async def convert_pdf(
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
+    # Advisory fast-fail only: file.size is client-declared and may be
+    # absent for chunked uploads. The real limit is enforced on the byte
+    # count inside the streaming copy below.
     if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail=f"File too large. Maximum size: {MAX_FILE_SIZE} bytes")
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size: {MAX_FILE_SIZE} bytes")
     
     # Generate task ID
     task_id = str(uuid.uuid4())
     
     try:
-        # Save uploaded file
+        # Stream the upload to disk in chunks so memory stays flat and the
+        # event loop is never blocked on a large synchronous write
         file_path = UPLOAD_DIR / f"{task_id}_{file.filename}"
+        total_bytes = 0
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(1 << 20):
+                total_bytes += len(chunk)
+                if total_bytes > MAX_FILE_SIZE:
+                    # Abort without consuming the rest of the body
+                    await buffer.close()
+                    file_path.unlink(missing_ok=True)
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size: {MAX_FILE_SIZE} bytes"
+                    )
+                await buffer.write(chunk)
         
-        logger.info(f"Uploaded file saved: {file_path} ({len(content)} bytes)")
+        logger.info(f"Uploaded file saved: {file_path} ({total_bytes} bytes)")
         
-        # Validate PDF file
+        # Validate PDF file (fitz does blocking I/O; keep it off the loop)
         pdf_processor = PDFProcessor(str(TEMP_DIR))
-        if not pdf_processor.validate_pdf(str(file_path)):
+        if not await asyncio.to_thread(pdf_processor.validate_pdf, str(file_path)):
             # Clean up invalid file
             file_path.unlink(missing_ok=True)
             raise HTTPException(status_code=400, detail="Invalid or corrupted PDF file")
@@ -164,7 +244,7 @@ async def convert_pdf(
             "filename": file.filename,
             "file_path": str(file_path),
             "status": "uploaded",
-            "created_at": asyncio.get_event_loop().time()
+            "created_at": time.monotonic()
         }
         
         # Start conversion in background
@@ -205,16 +285,18 @@ async def process_pdf_conversion(task_id: str, pdf_path: str):
         
         # Get refinement engine
         engine = await get_refinement_engine()
-        engine.progress_callback = progress_callback
-        
-        # Process the PDF
-        result = await engine.convert_pdf_to_html(pdf_path, task_id)
+
+        # Process the PDF; the callback rides with this conversion so
+        # concurrent tasks on the shared engine stay independent
+        result = await engine.convert_pdf_to_html(
+            pdf_path, task_id, progress_callback=progress_callback
+        )
         
         # Update conversion results
         conversion_results[task_id].update({
             "status": result["status"],
             "result": result,
-            "completed_at": asyncio.get_event_loop().time()
+            "completed_at": time.monotonic()
         })
         
         if result["status"] == "success":
@@ -227,6 +309,9 @@ async def process_pdf_conversion(task_id: str, pdf_path: str):
                 processing_time=result["processing_time"],
                 errors=result["errors"]
             )
+            # Encode the download payload once; keeping only the bytes also
+            # avoids holding the document in memory twice
+            conversion_results[task_id]["html_bytes"] = result.pop("combined_html").encode("utf-8")
             logger.info(f"PDF conversion completed successfully for task {task_id}")
         else:
             # Notify error via WebSocket
@@ -242,7 +327,7 @@ async def process_pdf_conversion(task_id: str, pdf_path: str):
             conversion_results[task_id].update({
                 "status": "error",
                 "error": error_message,
-                "completed_at": asyncio.get_event_loop().time()
+                "completed_at": time.monotonic()
             })
         
         # Notify error via WebSocket
@@ -281,17 +366,16 @@ async def websocket_endpoint(websocket: WebSocket, task_id: str):
         # Keep connection alive and handle any client messages
         while True:
             try:
-                # Wait for messages from client (keep-alive, etc.)
-                data = await websocket.receive_text()
+                # Accept binary or text frames without forcing a transcode
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                data = message.get("bytes") if message.get("bytes") is not None else message.get("text")
                 logger.debug(f"Received WebSocket message from task {task_id}: {data}")
                 
                 # Echo back or handle specific client messages if needed
                 # For now, we just acknowledge receipt
-                await websocket.send_text(json.dumps({
-                    "type": "acknowledgment",
-                    "message": "Message received",
-                    "timestamp": asyncio.get_event_loop().time()
-                }))
+                await websocket.send_bytes(_ACK_TEMPLATE % int(time.monotonic() * 1e6))
                 
             except WebSocketDisconnect:
                 logger.info(f"WebSocket client disconnected for task {task_id}")
@@ -334,7 +418,7 @@ async def get_task_status(task_id: str):
         "completed_at": task_info.get("completed_at"),
         "websocket_connected": websocket_manager.is_connected(task_id),
         "websocket_status": websocket_status,
-        "result_available": task_info["status"] == "success" and "result" in task_info,
+        "result_available": task_info["status"] == "success" and "html_bytes" in task_info,
         "error": task_info.get("error")
     }
 
@@ -358,15 +442,12 @@ async def download_html(task_id: str):
     if task_info["status"] != "success":
         raise HTTPException(status_code=400, detail="Conversion not completed successfully")
     
-    if "result" not in task_info or "combined_html" not in task_info["result"]:
+    if "html_bytes" not in task_info:
         raise HTTPException(status_code=404, detail="HTML result not available")
     
     try:
-        # Create temporary HTML file
-        html_content = task_info["result"]["combined_html"]
-        temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False)
-        temp_file.write(html_content)
-        temp_file.close()
+        # Pre-encoded at completion time; serving it is a pure socket send
+        html_bytes = task_info["html_bytes"]
         
         # Generate filename
         original_filename = Path(task_info["filename"]).stem
@@ -374,11 +455,10 @@ async def download_html(task_id: str):
         
         logger.info(f"Serving HTML download for task {task_id}: {download_filename}")
         
-        return FileResponse(
-            path=temp_file.name,
-            filename=download_filename,
+        return Response(
+            content=html_bytes,
             media_type='text/html',
-            background=BackgroundTasks()  # This will clean up the temp file after download
+            headers={"Content-Disposition": f'attachment; filename="{download_filename}"'}
         )
         
     except Exception as e:
@@ -387,36 +467,48 @@ async def download_html(task_id: str):
 
 
 @app.get("/api/tasks")
-async def list_tasks():
+async def list_tasks(limit: int = 50, offset: int = 0):
     """
-    List all active and recent conversion tasks.
+    List active and recent conversion tasks, newest first.
+    
+    Args:
+        limit: Maximum number of tasks to return
+        offset: Number of tasks to skip from the newest
     
     Returns:
-        List of task summaries
+        Page of task summaries
     """
-    tasks = []
-    current_time = asyncio.get_event_loop().time()
+    current_time = time.monotonic()
     
-    for task_id, task_info in conversion_results.items():
-        # Only include tasks from the last 24 hours
-        age = current_time - task_info["created_at"]
-        if age < 86400:  # 24 hours
-            tasks.append({
-                "task_id": task_id,
-                "filename": task_info["filename"],
-                "status": task_info["status"],
-                "created_at": task_info["created_at"],
-                "completed_at": task_info.get("completed_at"),
-                "websocket_connected": websocket_manager.is_connected(task_id),
-                "age_seconds": age
-            })
+    # Only include tasks from the last 24 hours, newest first; full dicts
+    # are only built for the requested page
+    recent = sorted(
+        (
+            (task_id, task_info) for task_id, task_info in conversion_results.items()
+            if current_time - task_info["created_at"] < 86400
+        ),
+        key=lambda item: item[1]["created_at"],
+        reverse=True
+    )
     
-    # Sort by creation time (newest first)
-    tasks.sort(key=lambda x: x["created_at"], reverse=True)
+    tasks = [
+        {
+            "task_id": task_id,
+            "filename": task_info["filename"],
+            "status": task_info["status"],
+            "created_at": task_info["created_at"],
+            "completed_at": task_info.get("completed_at"),
+            "websocket_connected": websocket_manager.is_connected(task_id),
+            "age_seconds": current_time - task_info["created_at"]
+        }
+        for task_id, task_info in recent[offset:offset + limit]
+    ]
     
     return {
         "tasks": tasks,
-        "total_tasks": len(tasks),
+        "total_tasks": len(recent),
+        "limit": limit,
+        "offset": offset,
         "active_connections": websocket_manager.get_active_connections_count()
     }
 
@@ -455,10 +547,26 @@ async def cleanup_task(task_id: str):
 
 
 # Application startup and shutdown events
+async def _sweep_expired_tasks():
+    """Periodically evict task records past their TTL."""
+    while True:
+        await asyncio.sleep(TASK_SWEEP_INTERVAL)
+        try:
+            current_time = time.monotonic()
+            for task_id in conversion_results.sweep_expired(current_time):
+                websocket_manager.cleanup_task(task_id)
+                logger.info(f"Expired task record: {task_id}")
+        except Exception as e:
+            logger.warning(f"Error sweeping expired tasks: {str(e)}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Application startup tasks."""
     logger.info("PDF to HTML Converter API starting up...")
+    
+    # Evict stale task records in the background for the process lifetime
+    asyncio.create_task(_sweep_expired_tasks())
     logger.info(f"Upload directory: {UPLOAD_DIR}")
     logger.info(f"Temp directory: {TEMP_DIR}")
     logger.info(f"Screenshots directory: {SCREENSHOTS_DIR}")
@@ -478,29 +586,17 @@ async def shutdown_event():
     """Application shutdown tasks."""
     logger.info("PDF to HTML Converter API shutting down...")
     
-    # Clean up any remaining resources
+    # Clean up any remaining resources. scandir's DirEntry reuses the
+    # file type the kernel already reported, avoiding a stat per entry
     try:
-        # Clean up temporary files
-        for temp_file in TEMP_DIR.glob("*"):
-            if temp_file.is_file():
-                temp_file.unlink()
+        for directory in (TEMP_DIR, SCREENSHOTS_DIR):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        os.unlink(entry.path)
         
-        for screenshot_file in SCREENSHOTS_DIR.glob("*"):
-            if screenshot_file.is_file():
-                screenshot_file.unlink()
-                
         logger.info("Temporary files cleaned up")
         
     except Exception as e:
         logger.warning(f"Error during cleanup: {str(e)}")
 
-
-# Run the application
-if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
@@ -1,20 +1,105 @@
 """
 PDF Processing Module
 
-Extracts PDF pages as high-resolution PNG images using PyMuPDF.
+Extracts PDF pages as high-resolution images using PyMuPDF.
 Optimized for visual fidelity to support accurate HTML conversion.
 """
 
 import fitz  # PyMuPDF
+import asyncio
 import os
 import tempfile
 import uuid
-from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared process pool for CPU-bound page rasterization, created lazily so
+# importing this module never forks workers
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Get the module-level rasterization pool, creating it on first use."""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _render_pool
+
+
+def _render_page(
+    pdf_bytes: bytes,
+    page_num: int,
+    dpi: int,
+    image_format: str,
+    temp_dir: str,
+    write_to_disk: bool = False
+) -> Dict:
+    """
+    Render a single PDF page to encoded image bytes (runs in a pool worker).
+
+    Opens its own document from the shared PDF bytes so workers never
+    contend on a document handle. By default the encoded image is returned
+    in memory; pass write_to_disk=True to also stage it in temp_dir.
+
+    Args:
+        pdf_bytes: Raw bytes of the whole PDF
+        page_num: Zero-based page index to render
+        dpi: Resolution for image extraction
+        image_format: Output image format (png, jpeg)
+        temp_dir: Directory for the rendered image (write_to_disk only)
+        write_to_disk: Also save the image and include its path
+
+    Returns:
+        Page information dictionary
+    """
+    pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page = pdf_document[page_num]
+
+        # Calculate zoom matrix for high-resolution rendering
+        zoom = dpi / 72.0  # 72 DPI is the default
+        mat = fitz.Matrix(zoom, zoom)
+
+        # Render page as pixmap
+        pix = page.get_pixmap(matrix=mat)
+
+        # Encode in memory; quality 85 is visually transparent for
+        # comparison purposes and roughly a tenth the size of PNG
+        if image_format == "png":
+            image_bytes = pix.tobytes("png")
+        else:
+            image_bytes = pix.tobytes("jpeg", jpg_quality=85)
+
+        # Get page dimensions
+        rect = page.rect
+
+        page_info = {
+            "page_number": page_num + 1,
+            "image_bytes": image_bytes,
+            "width": rect.width,
+            "height": rect.height,
+            "dpi": dpi,
+            "format": image_format,
+            "pixel_width": pix.width,
+            "pixel_height": pix.height
+        }
+
+        if write_to_disk:
+            extension = "jpg" if image_format == "jpeg" else image_format
+            image_filename = f"page_{page_num + 1}_{uuid.uuid4().hex}.{extension}"
+            image_path = Path(temp_dir) / image_filename
+            image_path.write_bytes(image_bytes)
+            page_info["image_path"] = str(image_path)
+            page_info["image_filename"] = image_filename
+
+        return page_info
+    finally:
+        pdf_document.close()
+
 
 class PDFProcessor:
     """
@@ -30,12 +115,69 @@ class PDFProcessor:
         """
         self.temp_dir = Path(temp_dir)
         self.temp_dir.mkdir(exist_ok=True, parents=True)
+        # One cached open document per processor; validate/info/extract all
+        # reuse it so the xref table is parsed once per conversion
+        self._doc: Optional[fitz.Document] = None
+        self._doc_path: Optional[str] = None
+        self._bound_path: Optional[str] = None
         
+
+    @classmethod
+    def open(cls, pdf_path: str, temp_dir: str = "./temp") -> "PDFProcessor":
+        """
+        Create a processor bound to one document.
+
+        Use as an async context manager so the document is opened once up
+        front and closed on exit:
+
+            async with PDFProcessor.open(pdf_path) as processor:
+                ...
+
+        Args:
+            pdf_path: Path to the PDF file
+            temp_dir: Directory for temporary files
+
+        Returns:
+            A PDFProcessor ready to enter as an async context manager
+        """
+        processor = cls(temp_dir)
+        processor._bound_path = pdf_path
+        return processor
+
+    async def __aenter__(self):
+        """Async context manager entry: open the bound document."""
+        if self._bound_path:
+            await asyncio.to_thread(self._get_document, self._bound_path)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit: close the cached document."""
+        self.close()
+
+    def _get_document(self, pdf_path: str) -> fitz.Document:
+        """Get the cached document for a path, opening it on first use."""
+        if self._doc is None or self._doc_path != pdf_path:
+            self.close()
+            self._doc = fitz.open(pdf_path)
+            self._doc_path = pdf_path
+        return self._doc
+
+    def close(self) -> None:
+        """Close the cached document, if any."""
+        if self._doc is not None:
+            try:
+                self._doc.close()
+            except Exception as e:
+                logger.warning(f"Error closing PDF document {self._doc_path}: {str(e)}")
+            self._doc = None
+            self._doc_path = None
+
     async def extract_pages_as_images(
         self, 
         pdf_path: str, 
         dpi: int = 300,
-        image_format: str = "png"
+        image_format: str = "jpeg",
+        write_to_disk: bool = False
     ) -> List[Dict]:
         """
         Extract all pages from PDF as high-resolution images.
@@ -43,69 +185,49 @@ class PDFProcessor:
         Args:
             pdf_path: Path to the PDF file
             dpi: Resolution for image extraction (default: 300 DPI for high quality)
-            image_format: Output image format (png, jpeg)
+            image_format: Output image format (jpeg by default; png for lossless)
+            write_to_disk: Stage images in the temp dir and include their
+                paths; by default pages carry only in-memory image_bytes
             
         Returns:
-            List of dictionaries containing page information and image paths
+            List of dictionaries containing page information and image bytes
+            (and paths when write_to_disk is set)
             
         Raises:
             Exception: If PDF processing fails
         """
+        # Normalize per-call invariants once, before any work is fanned out
+        image_format = image_format.lower()
+        if image_format not in ("png", "jpeg"):
+            raise ValueError(f"Unsupported image format: {image_format}")
+        
         try:
-            # Open PDF document
-            pdf_document = fitz.open(pdf_path)
-            pages_data = []
+            # Read the PDF once for the workers (they open their own
+            # document from the shared bytes); the page count comes from
+            # the cached document so the file is not re-parsed here
+            pdf_bytes = await asyncio.to_thread(Path(pdf_path).read_bytes)
+            page_count = len(await asyncio.to_thread(self._get_document, pdf_path))
+            
+            logger.info(f"Processing PDF with {page_count} pages")
             
-            logger.info(f"Processing PDF with {len(pdf_document)} pages")
+            # Rasterization is CPU-bound; shard pages across a process pool
+            loop = asyncio.get_running_loop()
+            pool = _get_render_pool()
+            pages_data = await asyncio.gather(*[
+                loop.run_in_executor(
+                    pool, _render_page,
+                    pdf_bytes, page_num, dpi, image_format, str(self.temp_dir), write_to_disk
+                )
+                for page_num in range(page_count)
+            ])
+            pages_data = list(pages_data)
             
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                
-                # Calculate zoom matrix for high-resolution rendering
-                zoom = dpi / 72.0  # 72 DPI is the default
-                mat = fitz.Matrix(zoom, zoom)
-                
-                # Render page as pixmap
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Generate unique filename for this page image
-                image_filename = f"page_{page_num + 1}_{uuid.uuid4().hex}.{image_format}"
-                image_path = self.temp_dir / image_filename
-                
-                # Save image
-                if image_format.lower() == "png":
-                    pix.save(str(image_path))
-                elif image_format.lower() == "jpeg":
-                    pix.save(str(image_path), jpg_quality=95)
-                else:
-                    raise ValueError(f"Unsupported image format: {image_format}")
-                
-                # Get page dimensions
-                rect = page.rect
-                page_width = rect.width
-                page_height = rect.height
-                
-                # Store page information
-                page_info = {
-                    "page_number": page_num + 1,
-                    "image_path": str(image_path),
-                    "image_filename": image_filename,
-                    "width": page_width,
-                    "height": page_height,
-                    "dpi": dpi,
-                    "format": image_format,
-                    "pixel_width": pix.width,
-                    "pixel_height": pix.height
-                }
-                
-                pages_data.append(page_info)
-                
-                logger.info(f"Extracted page {page_num + 1}: {page_width}x{page_height}pt -> {pix.width}x{pix.height}px")
-                
-                # Clean up pixmap
-                pix = None
-                
-            pdf_document.close()
+            for page_info in pages_data:
+                logger.info(
+                    f"Extracted page {page_info['page_number']}: "
+                    f"{page_info['width']}x{page_info['height']}pt -> "
+                    f"{page_info['pixel_width']}x{page_info['pixel_height']}px"
+                )
             
             logger.info(f"Successfully extracted {len(pages_data)} pages from PDF")
             return pages_data
@@ -114,6 +236,65 @@ class PDFProcessor:
             logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
             raise Exception(f"Failed to process PDF: {str(e)}")
     
+    async def iter_pages(
+        self,
+        pdf_path: str,
+        dpi: int = 300,
+        image_format: str = "jpeg",
+        write_to_disk: bool = False
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield pages as high-resolution images as rasterization completes.
+
+        Same contract as extract_pages_as_images, but pages are yielded
+        the moment a pool worker finishes them — in completion order, not
+        page order — so downstream work can overlap the remaining
+        rasterization instead of waiting for the whole document.
+
+        Args:
+            pdf_path: Path to the PDF file
+            dpi: Resolution for image extraction
+            image_format: Output image format (jpeg by default; png for lossless)
+            write_to_disk: Stage images in the temp dir and include their paths
+
+        Yields:
+            Page information dictionaries, in rasterization-completion order
+
+        Raises:
+            Exception: If PDF processing fails
+        """
+        image_format = image_format.lower()
+        if image_format not in ("png", "jpeg"):
+            raise ValueError(f"Unsupported image format: {image_format}")
+        
+        try:
+            pdf_bytes = await asyncio.to_thread(Path(pdf_path).read_bytes)
+            page_count = len(await asyncio.to_thread(self._get_document, pdf_path))
+            
+            logger.info(f"Processing PDF with {page_count} pages")
+            
+            loop = asyncio.get_running_loop()
+            pool = _get_render_pool()
+            futures = [
+                loop.run_in_executor(
+                    pool, _render_page,
+                    pdf_bytes, page_num, dpi, image_format, str(self.temp_dir), write_to_disk
+                )
+                for page_num in range(page_count)
+            ]
+        except Exception as e:
+            logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
+            raise Exception(f"Failed to process PDF: {str(e)}")
+        
+        for completed in asyncio.as_completed(futures):
+            page_info = await completed
+            logger.info(
+                f"Extracted page {page_info['page_number']}: "
+                f"{page_info['width']}x{page_info['height']}pt -> "
+                f"{page_info['pixel_width']}x{page_info['pixel_height']}px"
+            )
+            yield page_info
+
     async def get_pdf_info(self, pdf_path: str) -> Dict:
         """
         Get basic information about a PDF file.
@@ -125,7 +306,7 @@ class PDFProcessor:
             Dictionary containing PDF metadata
         """
         try:
-            pdf_document = fitz.open(pdf_path)
+            pdf_document = await asyncio.to_thread(self._get_document, pdf_path)
             
             metadata = pdf_document.metadata
             page_count = len(pdf_document)
@@ -137,7 +318,7 @@ class PDFProcessor:
                 "height": first_page.rect.height if first_page else 0
             }
             
-            pdf_info = {
+            return {
                 "title": metadata.get("title", ""),
                 "author": metadata.get("author", ""),
                 "subject": metadata.get("subject", ""),
@@ -150,9 +331,6 @@ class PDFProcessor:
                 "file_size": os.path.getsize(pdf_path)
             }
             
-            pdf_document.close()
-            return pdf_info
-            
         except Exception as e:
             logger.error(f"Error getting PDF info for {pdf_path}: {str(e)}")
             raise Exception(f"Failed to get PDF info: {str(e)}")
@@ -165,11 +343,15 @@ class PDFProcessor:
             pages_data: List of page data dictionaries containing image paths
         """
         for page_data in pages_data:
+            if not page_data.get("image_path"):
+                # In-memory pages have nothing staged on disk
+                continue
             try:
-                image_path = Path(page_data["image_path"])
-                if image_path.exists():
-                    image_path.unlink()
-                    logger.debug(f"Cleaned up temporary file: {image_path}")
+                # Unlink directly; a missing file is not worth a pre-check stat
+                os.unlink(page_data["image_path"])
+                logger.debug(f"Cleaned up temporary file: {page_data['image_path']}")
+            except FileNotFoundError:
+                pass
             except Exception as e:
                 logger.warning(f"Could not clean up file {page_data.get('image_path')}: {str(e)}")
     
@@ -184,10 +366,7 @@ class PDFProcessor:
             True if valid PDF, False otherwise
         """
         try:
-            pdf_document = fitz.open(pdf_path)
-            page_count = len(pdf_document)
-            pdf_document.close()
-            return page_count > 0
+            return len(self._get_document(pdf_path)) > 0
         except Exception as e:
             logger.warning(f"PDF validation failed for {pdf_path}: {str(e)}")
             return False
@@ -205,17 +384,16 @@ async def process_pdf_file(pdf_path: str, temp_dir: str = "./temp") -> Tuple[Lis
     Returns:
         Tuple of (pages_data, pdf_info)
     """
-    processor = PDFProcessor(temp_dir)
-    
-    # Validate PDF first
-    if not processor.validate_pdf(pdf_path):
-        raise ValueError("Invalid or unreadable PDF file")
-    
-    # Get PDF info
-    pdf_info = await processor.get_pdf_info(pdf_path)
-    
-    # Extract pages
-    pages_data = await processor.extract_pages_as_images(pdf_path)
+    async with PDFProcessor.open(pdf_path, temp_dir) as processor:
+        # Validate PDF first (document is already open at this point)
+        if not processor.validate_pdf(pdf_path):
+            raise ValueError("Invalid or unreadable PDF file")
+        
+        # Get PDF info
+        pdf_info = await processor.get_pdf_info(pdf_path)
+        
+        # Extract pages
+        pages_data = await processor.extract_pages_as_images(pdf_path)
     
     return pages_data, pdf_info
 
@@ -7,20 +7,91 @@ AI generation, and visual comparison for maximum fidelity.
 """
 
 import asyncio
+import functools
+import gzip
+import hashlib
+import html
+import io
 import os
+import string
+import time
+import orjson
 import uuid
+from operator import itemgetter
 from typing import Dict, List, Optional, Callable, Any
 from pathlib import Path
 import logging
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 from .pdf_processor import PDFProcessor
 from .gemini_client import GeminiClient
 from .html_renderer import HTMLRenderer
 
+# C-backed HTML parser for body extraction; optional, with a regex fallback
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Combined-document boilerplate, encoded once at import; only the title
+# varies per conversion and is spliced in with a single bytes.replace
+_COMBINED_HEADER = (
+    b'<!DOCTYPE html>\n'
+    b'<html lang="en">\n'
+    b'<head>\n'
+    b'    <meta charset="UTF-8">\n'
+    b'    <meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+    b'    <title>__TITLE__</title>\n'
+    b'    <style>\n'
+    b'        body { margin: 0; padding: 20px; font-family: Arial, sans-serif; }\n'
+    b'        .pdf-page { margin-bottom: 40px; border-bottom: 2px solid #eee; padding-bottom: 20px; }\n'
+    b'        .page-header { color: #666; font-size: 12px; margin-bottom: 10px; }\n'
+    b'        .page-content { /* Individual page styles will be embedded */ }\n'
+    b'    </style>\n'
+    b'</head>\n'
+    b'<body>\n'
+)
+_COMBINED_FOOTER = b'</body>\n</html>'
+
+# Placeholder page shown when a page fails to process, parsed once at import
+_FALLBACK_TPL = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Page $page_number</title>
+    <style>
+        body {
+            margin: 40px;
+            font-family: Arial, sans-serif;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            min-height: 60vh;
+            background-color: #f8f9fa;
+        }
+        .error-message {
+            text-align: center;
+            color: #6c757d;
+            padding: 40px;
+            border: 2px dashed #dee2e6;
+            border-radius: 10px;
+        }
+    </style>
+</head>
+<body>
+    <div class="error-message">
+        <h2>Page $page_number</h2>
+        <p>This page could not be processed automatically.</p>
+        <p><small>Original dimensions: ${width}pt × ${height}pt</small></p>
+    </div>
+</body>
+</html>""")
+
 
 class RefinementEngine:
     """
@@ -33,7 +104,9 @@ class RefinementEngine:
         screenshots_dir: str = "./screenshots", 
         max_iterations: int = 2,
         gemini_api_key: Optional[str] = None,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        early_exit_threshold: float = 8.5,
+        min_improvement: float = 0.3
     ):
         """
         Initialize the refinement engine.
@@ -44,37 +117,95 @@ class RefinementEngine:
             max_iterations: Maximum refinement iterations per page
             gemini_api_key: Gemini API key (loads from env if None)
             progress_callback: Function to call for progress updates
+            early_exit_threshold: Quality score at which refinement stops early
+            min_improvement: Minimum score gain required to keep iterating
         """
         self.temp_dir = Path(temp_dir)
         self.screenshots_dir = Path(screenshots_dir)
         self.max_iterations = max_iterations
         self.progress_callback = progress_callback
+        self.early_exit_threshold = early_exit_threshold
+        self.min_improvement = min_improvement
+        
+        # Pages processed in flight at once; each holds a Playwright page
+        # and Gemini budget, so keep this bounded
+        self.page_concurrency = int(os.getenv("PAGE_CONCURRENCY", "4"))
+        
+        # Pages grouped per initial-generation API call; 1 disables batching
+        self.batch_size = int(os.getenv("BATCH_SIZE", "4"))
+        self._page_sem = asyncio.Semaphore(self.page_concurrency)
+        self._browser_lock = asyncio.Lock()
+        # Conversions currently holding the shared browser open; the
+        # engine is a process-wide singleton, so overlapping conversions
+        # must refcount the browser instead of owning it outright
+        self._browser_refs = 0
+        
+        # Monotonic clock bound once; progress updates call it constantly
+        self._clock = time.monotonic
+        
+        # Per-conversion callbacks keyed by task id; the engine is
+        # shared, so a conversion-specific callback must never be bound
+        # to the instance where concurrent conversions would see it
+        self._task_callbacks: Dict[str, Callable] = {}
+
+        # Per-task progress throttle: concurrent page tasks emit dense
+        # update streams, so near-simultaneous ones are coalesced
+        self._last_progress_ts: Dict[str, float] = {}
+        self._progress_min_interval = 0.1
         
         # Create directories
         self.temp_dir.mkdir(exist_ok=True, parents=True)
         self.screenshots_dir.mkdir(exist_ok=True, parents=True)
         
-        # Initialize components
+        # Refined pages memoized by image content hash; repeated pages
+        # (blanks, boilerplate) skip the whole refinement pipeline
+        self.page_cache_dir = self.temp_dir / "page_cache"
+        self.page_cache_dir.mkdir(exist_ok=True, parents=True)
+        
+        # Initialize components. The renderer's pre-warmed page pool is
+        # sized to match page concurrency so no page task ever waits for
+        # (or allocates) a Playwright page mid-iteration
         self.pdf_processor = PDFProcessor(str(self.temp_dir))
         self.gemini_client = GeminiClient(api_key=gemini_api_key)
-        self.html_renderer = HTMLRenderer(str(self.screenshots_dir))
+        self.html_renderer = HTMLRenderer(
+            str(self.screenshots_dir),
+            pool_size=self.page_concurrency
+        )
         
-        # Task storage
-        self.active_tasks: Dict[str, Dict] = {}
+        # Task storage: bounded and time-limited so a long-running
+        # service cannot accumulate task state without limit. Heavy
+        # result fields live on disk under _persist_dir, not in memory
+        self.active_tasks: TTLCache = TTLCache(
+            maxsize=int(os.getenv("MAX_ACTIVE_TASKS", "1024")),
+            ttl=int(os.getenv("TASK_TTL_SEC", "3600"))
+        )
+        self._task_lock = asyncio.Lock()
+        self._persist_dir = self.temp_dir / "tasks"
+        self._persist_dir.mkdir(exist_ok=True, parents=True)
         
         logger.info("Refinement engine initialized successfully")
     
     async def convert_pdf_to_html(
         self, 
-        pdf_path: str, 
-        task_id: Optional[str] = None
+        pdf_path: str,
+        task_id: Optional[str] = None,
+        stream_only: bool = False,
+        progress_callback: Optional[Callable] = None
     ) -> Dict[str, Any]:
         """
         Convert entire PDF to HTML with iterative refinement.
-        
+
         Args:
             pdf_path: Path to the PDF file
             task_id: Optional task ID for tracking
+            progress_callback: Callback for this conversion's progress
+                updates; falls back to the engine-level callback when
+                not given
+            stream_only: When True, each page result is delivered through
+                the progress callback as it completes and the combined
+                document is written to disk; the returned dictionary
+                carries a combined_html_path and per-page metadata
+                without the HTML bodies, keeping peak memory flat
             
         Returns:
             Dictionary containing conversion results
@@ -91,71 +222,115 @@ class RefinementEngine:
             'completed_pages': 0,
             'pages': [],
             'errors': [],
-            'start_time': asyncio.get_event_loop().time()
+            'start_time': self._clock()
         }
-        self.active_tasks[task_id] = task_info
-        
+        async with self._task_lock:
+            self.active_tasks[task_id] = task_info
+
+        if progress_callback is not None:
+            self._task_callbacks[task_id] = progress_callback
+
+        browser_acquired = False
         try:
             await self._update_progress(task_id, "Extracting PDF pages...")
+
+            # Steps 1-2 share one per-conversion document handle. The
+            # engine is a process-wide singleton, so the shared
+            # processor's single-slot document cache must not be used
+            # here: overlapping conversions would evict and close each
+            # other's documents mid-use
+            async with PDFProcessor.open(pdf_path, str(self.temp_dir)) as processor:
+                # Step 1: Validate and read metadata through the bound
+                # document (opened once, closed when the context exits)
+                if not await asyncio.to_thread(processor.validate_pdf, pdf_path):
+                    raise ValueError("Invalid or unreadable PDF file")
+                pdf_info = await processor.get_pdf_info(pdf_path)
+                total_pages = pdf_info['page_count']
+
+                task_info['total_pages'] = total_pages
+                task_info['pdf_info'] = pdf_info
+
+                await self._update_progress(
+                    task_id,
+                    f"Processing {total_pages} pages with iterative refinement..."
+                )
+
+                # One browser serves all in-flight conversions; concurrent
+                # page tasks share it through the renderer's page pool. The
+                # first conversion in launches it, the last one out stops it
+                # (see the refcounted release in finally). With no refinement
+                # iterations nothing ever renders, so the Chromium launch is
+                # skipped entirely
+                if self.max_iterations > 0:
+                    async with self._browser_lock:
+                        if self._browser_refs == 0:
+                            await self.html_renderer.start_browser()
+                        self._browser_refs += 1
+                        browser_acquired = True
+
+                # Step 2: Pages stream out of the rasterization pool and go
+                # straight into processing, so CPU-bound extraction overlaps
+                # the network-bound Gemini work. Arriving pages are grouped
+                # into chunks whose initial HTML is generated in one batched
+                # call; each page task awaits its chunk's result
+                pages_data = []
+                page_tasks = []
+                batch_buffer = []
+
+                def _flush_batch() -> None:
+                    chunk = batch_buffer[:]
+                    batch_buffer.clear()
+                    if not chunk:
+                        return
+                    batch_task = None
+                    if self.batch_size > 1 and len(chunk) > 1:
+                        batch_task = asyncio.create_task(self._generate_chunk_htmls(chunk))
+                    for chunk_page in chunk:
+                        page_tasks.append(asyncio.create_task(
+                            self._page_with_batch(task_id, chunk_page, batch_task)
+                        ))
+
+                async for page_data in processor.iter_pages(pdf_path):
+                    pages_data.append(page_data)
+                    batch_buffer.append(page_data)
+                    if len(batch_buffer) >= self.batch_size:
+                        _flush_batch()
+                _flush_batch()
             
-            # Step 1: Extract PDF pages as images
-            pages_data, pdf_info = await self.pdf_processor.process_pdf_file(pdf_path, str(self.temp_dir))
-            
-            task_info['total_pages'] = len(pages_data)
-            task_info['pdf_info'] = pdf_info
-            
-            await self._update_progress(
-                task_id, 
-                f"Processing {len(pages_data)} pages with iterative refinement..."
-            )
-            
-            # Step 2: Process each page with refinement
             converted_pages = []
-            for page_data in pages_data:
-                try:
-                    page_result = await self._process_single_page(task_id, page_data)
-                    converted_pages.append(page_result)
-                    task_info['completed_pages'] += 1
-                    
-                    # Send page completion update
-                    await self._update_progress(
-                        task_id,
-                        f"Completed page {page_data['page_number']} of {len(pages_data)}"
-                    )
-                    
-                except Exception as e:
-                    error_msg = f"Error processing page {page_data['page_number']}: {str(e)}"
-                    logger.error(error_msg)
-                    task_info['errors'].append(error_msg)
-                    
-                    # Add a fallback page with basic HTML
-                    fallback_page = {
-                        'page_number': page_data['page_number'],
-                        'html_content': self._generate_fallback_html(page_data),
-                        'refinement_iterations': 0,
-                        'final_quality_score': 0,
-                        'processing_time': 0,
-                        'error': str(e)
-                    }
-                    converted_pages.append(fallback_page)
-                    task_info['completed_pages'] += 1
+            for completed in asyncio.as_completed(page_tasks):
+                page_result = await completed
+                converted_pages.append(page_result)
+                task_info['completed_pages'] += 1
+                
+                # Send page completion update; the page result rides
+                # along so streaming consumers get each page immediately
+                await self._update_progress(
+                    task_id,
+                    f"Completed page {page_result['page_number']} of {total_pages}",
+                    data={'page_result': page_result},
+                    force=True
+                )
             
             # Step 3: Combine all pages into final result
             combined_html = self._combine_pages_to_html(converted_pages, pdf_info)
             
-            # Update final task status
+            # Update final task status. The heavy fields (per-page HTML
+            # and the combined document) are persisted to disk and left
+            # out of the in-memory entry; get_task_status reloads them
             task_info['status'] = 'completed'
-            task_info['pages'] = converted_pages
-            task_info['combined_html'] = combined_html
-            task_info['end_time'] = asyncio.get_event_loop().time()
+            task_info['end_time'] = self._clock()
             task_info['total_time'] = task_info['end_time'] - task_info['start_time']
+            await asyncio.to_thread(
+                self._persist_task_result, task_id, converted_pages, combined_html
+            )
             
-            await self._update_progress(task_id, "Conversion completed successfully!")
+            await self._update_progress(task_id, "Conversion completed successfully!", force=True)
             
             # Cleanup temporary files
             await self._cleanup_temp_files(pages_data)
             
-            return {
+            result = {
                 'task_id': task_id,
                 'status': 'success',
                 'total_pages': len(pages_data),
@@ -167,6 +342,23 @@ class RefinementEngine:
                 'errors': task_info['errors']
             }
             
+            # Streaming consumers already received every page through the
+            # callback, so hand back a file path and page metadata only
+            # instead of holding all the HTML in the result
+            if stream_only:
+                combined_path = self._persist_dir / f"{task_id}.html"
+                await asyncio.to_thread(
+                    combined_path.write_text, combined_html, encoding='utf-8'
+                )
+                result['combined_html_path'] = str(combined_path)
+                del result['combined_html']
+                result['pages'] = [
+                    {key: value for key, value in page.items() if key != 'html_content'}
+                    for page in converted_pages
+                ]
+            
+            return result
+            
         except Exception as e:
             error_msg = f"Fatal error in PDF conversion: {str(e)}"
             logger.error(error_msg)
@@ -174,7 +366,7 @@ class RefinementEngine:
             task_info['status'] = 'failed'
             task_info['errors'].append(error_msg)
             
-            await self._update_progress(task_id, f"Conversion failed: {str(e)}")
+            await self._update_progress(task_id, f"Conversion failed: {str(e)}", force=True)
             
             return {
                 'task_id': task_id,
@@ -182,20 +374,185 @@ class RefinementEngine:
                 'error': str(e),
                 'errors': task_info['errors']
             }
+            
+        finally:
+            self._task_callbacks.pop(task_id, None)
+            self._last_progress_ts.pop(task_id, None)
+            if browser_acquired:
+                async with self._browser_lock:
+                    self._browser_refs -= 1
+                    if self._browser_refs == 0:
+                        await self.html_renderer.stop_browser()
     
-    async def _process_single_page(self, task_id: str, page_data: Dict) -> Dict[str, Any]:
+
+    async def _generate_chunk_htmls(self, chunk: List[Dict]) -> Dict[int, str]:
+        """
+        Generate initial HTML for one chunk of pages in a single call.
+
+        A chunk that fails outright returns an empty mapping; its pages
+        regenerate individually during refinement.
+
+        Args:
+            chunk: Page data dictionaries forming one batch
+
+        Returns:
+            Mapping of page number to generated initial HTML
+        """
+        try:
+            htmls = await self.gemini_client.generate_initial_html_batch(
+                [page.get('image_path') for page in chunk],
+                page_infos=chunk,
+                images_bytes=(
+                    [page['image_bytes'] for page in chunk]
+                    if all(page.get('image_bytes') is not None for page in chunk)
+                    else None
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Batched initial generation failed for a chunk: {str(e)}")
+            return {}
+        return {
+            page_data['page_number']: html
+            for page_data, html in zip(chunk, htmls)
+            if html
+        }
+
+    async def _page_with_batch(
+        self,
+        task_id: str,
+        page_data: Dict,
+        batch_task: Optional["asyncio.Task"]
+    ) -> Dict[str, Any]:
+        """
+        Process one page, first awaiting its chunk's batched initial HTML.
+
+        Args:
+            task_id: Task identifier
+            page_data: Page data from PDF processor
+            batch_task: Shared task resolving to the chunk's initial HTML
+
+        Returns:
+            Dictionary containing page processing results
+        """
+        initial_html = None
+        if batch_task is not None:
+            initial_html = (await batch_task).get(page_data['page_number'])
+        return await self._bounded_process(task_id, page_data, initial_html)
+
+    async def _bounded_process(
+        self,
+        task_id: str,
+        page_data: Dict,
+        initial_html: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Process one page under the concurrency semaphore.
+
+        Failures are contained here: a page that cannot be processed
+        returns its fallback HTML instead of failing the whole task.
+
+        Args:
+            task_id: Task identifier
+            page_data: Page data from PDF processor
+            initial_html: Pre-generated initial HTML from a batched call
+
+        Returns:
+            Dictionary containing page processing results
+        """
+        async with self._page_sem:
+            try:
+                return await self._process_single_page(task_id, page_data, initial_html)
+            except Exception as e:
+                error_msg = f"Error processing page {page_data['page_number']}: {str(e)}"
+                logger.error(error_msg)
+                if task_id in self.active_tasks:
+                    self.active_tasks[task_id]['errors'].append(error_msg)
+                
+                # Fall back to basic HTML for this page
+                return {
+                    'page_number': page_data['page_number'],
+                    'html_content': self._generate_fallback_html(page_data),
+                    'refinement_iterations': 0,
+                    'final_quality_score': 0,
+                    'processing_time': 0,
+                    'error': str(e)
+                }
+
+
+    @staticmethod
+    def _page_key(page_data: Dict) -> str:
+        """Content-hash key for a page image (bytes preferred over path)."""
+        image_bytes = page_data.get('image_bytes')
+        if image_bytes is None:
+            image_bytes = Path(page_data['image_path']).read_bytes()
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+    def _lookup_cached_page(self, page_key: str) -> Optional[Dict]:
+        """Load a memoized refined page from disk, if present."""
+        cache_file = self.page_cache_dir / f"{page_key}.json"
+        try:
+            if cache_file.exists():
+                return orjson.loads(cache_file.read_bytes())
+        except Exception as e:
+            logger.warning(f"Failed to read page cache entry {page_key}: {str(e)}")
+        return None
+
+    def _store_cached_page(self, page_key: str, html_content: str, quality_score: int) -> None:
+        """Persist a refined page atomically (write + os.replace)."""
+        cache_file = self.page_cache_dir / f"{page_key}.json"
+        try:
+            payload = orjson.dumps({
+                'html_content': html_content,
+                'final_quality_score': quality_score
+            })
+            tmp_file = cache_file.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+            tmp_file.write_bytes(payload)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logger.warning(f"Failed to persist page cache entry {page_key}: {str(e)}")
+
+    async def _process_single_page(
+        self,
+        task_id: str,
+        page_data: Dict,
+        initial_html: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Process a single PDF page with iterative refinement.
         
         Args:
             task_id: Task identifier
             page_data: Page data from PDF processor
+            initial_html: Pre-generated initial HTML from a batched call
             
         Returns:
             Dictionary containing page processing results
         """
         page_number = page_data['page_number']
-        start_time = asyncio.get_event_loop().time()
+        start_time = self._clock()
+        
+        # Step 0: Identical page images produce identical results; serve
+        # repeats straight from the disk cache
+        page_key = await asyncio.to_thread(self._page_key, page_data)
+        cached_page = await asyncio.to_thread(self._lookup_cached_page, page_key)
+        if cached_page is not None:
+            logger.info(f"Page cache hit for page {page_number}")
+            return {
+                'page_number': page_number,
+                'html_content': cached_page['html_content'],
+                'refinement_iterations': 0,
+                'final_quality_score': cached_page.get('final_quality_score', 7),
+                'quality_progression': [],
+                'processing_time': self._clock() - start_time,
+                'original_dimensions': {
+                    'width': page_data['width'],
+                    'height': page_data['height']
+                },
+                'pixel_dimensions': {
+                    'width': page_data['pixel_width'],
+                    'height': page_data['pixel_height']
+                }
+            }
         
         logger.info(f"Processing page {page_number} with iterative refinement")
         
@@ -205,17 +562,46 @@ class RefinementEngine:
             f"Generating HTML for page {page_number}..."
         )
         
-        current_html = await self.gemini_client.generate_initial_html(
-            page_data['image_path'], 
-            page_data
-        )
+        if initial_html is not None:
+            current_html = initial_html
+        else:
+            current_html = await self.gemini_client.generate_initial_html(
+                page_data.get('image_path'),
+                page_data,
+                image_bytes=page_data.get('image_bytes')
+            )
         
-        # Step 2: Iterative refinement process
-        refinement_iterations = 0
-        quality_scores = []
+        # Cheap mode: no refinement requested, so skip the remote page
+        # cache, rendering, and quality analysis entirely
+        if self.max_iterations <= 0:
+            return {
+                'page_number': page_number,
+                'html_content': current_html,
+                'refinement_iterations': 0,
+                'final_quality_score': 7,
+                'quality_progression': [],
+                'processing_time': self._clock() - start_time,
+                'original_dimensions': {
+                    'width': page_data['width'],
+                    'height': page_data['height']
+                },
+                'pixel_dimensions': {
+                    'width': page_data['pixel_width'],
+                    'height': page_data['pixel_height']
+                }
+            }
         
-        # Start browser for this page processing
-        await self.html_renderer.start_browser()
+        # Step 2: Iterative refinement process (the conversion-wide
+        # browser is already running at this point). Cache the original
+        # page image remotely so iterations do not re-send it
+        refinement_iterations = 0
+        quality_tasks = []
+        last_score = None
+        cache_name = await self.gemini_client.create_page_cache(
+            page_data.get('image_path'),
+            image_bytes=page_data.get('image_bytes'),
+            page_number=page_number
+        )
         
         try:
             for iteration in range(self.max_iterations):
@@ -226,50 +612,92 @@ class RefinementEngine:
                     f"Refining page {page_number} (iteration {iteration + 1}/{self.max_iterations})..."
                 )
                 
-                # Render current HTML and take screenshot
-                screenshot_path = await self.html_renderer.render_and_screenshot(
-                    current_html, 
+                # Render current HTML, measure it, and capture the
+                # screenshot in memory (no disk staging or later cleanup)
+                screenshot_jpeg, rendered_dims = await self.html_renderer.screenshot_bytes(
+                    current_html,
                     page_data
                 )
-                
+
+                # Quality analysis only feeds the final score, so run it in
+                # the background and let the next iteration proceed
+                quality_tasks.append(asyncio.create_task(
+                    self.gemini_client.analyze_visual_similarity(
+                        page_data.get('image_path'),
+                        screenshot_bytes=screenshot_jpeg,
+                        original_image_bytes=page_data.get('image_bytes'),
+                        cache_name=cache_name
+                    )
+                ))
+
                 # Refine HTML using visual comparison
                 try:
-                    refined_html = await self.gemini_client.refine_html(
-                        page_data['image_path'],
+                    current_html = await self.gemini_client.refine_html(
+                        page_data.get('image_path'),
                         current_html,
-                        screenshot_path,
-                        page_data,
-                        iteration + 1
+                        page_info=page_data,
+                        iteration=iteration + 1,
+                        screenshot_bytes=screenshot_jpeg,
+                        original_image_bytes=page_data.get('image_bytes'),
+                        cache_name=cache_name
                     )
-                    
-                    # Optional: Analyze quality (if we want to track improvement)
-                    try:
-                        quality_analysis = await self.gemini_client.analyze_visual_similarity(
-                            page_data['image_path'],
-                            screenshot_path
-                        )
-                        quality_scores.append(quality_analysis.get('overall_score', 7))
-                    except Exception as e:
-                        logger.warning(f"Quality analysis failed for page {page_number}: {str(e)}")
-                        quality_scores.append(7)  # Default score
-                    
-                    # Update current HTML for next iteration
-                    current_html = refined_html
-                    
-                    # Clean up screenshot
-                    self.html_renderer.cleanup_screenshot(screenshot_path)
-                    
+
                 except Exception as e:
                     logger.warning(f"Refinement iteration {iteration + 1} failed for page {page_number}: {str(e)}")
                     # Continue with current HTML if refinement fails
                     break
+
+                # Early exit: the analysis overlapped the refinement call
+                # above, so its score is (nearly) ready by now. Skip the
+                # remaining iterations once the page scores high enough or
+                # the score has plateaued; each skipped iteration saves a
+                # render plus two Gemini round-trips
+                if iteration + 1 < self.max_iterations:
+                    try:
+                        analysis = await quality_tasks[-1]
+                        score = analysis.get('overall_score', 7)
+                    except Exception:
+                        score = None
+                    if score is not None:
+                        if score >= self.early_exit_threshold:
+                            logger.info(
+                                f"Page {page_number} reached quality {score} >= "
+                                f"{self.early_exit_threshold}; stopping refinement early"
+                            )
+                            break
+                        if (last_score is not None
+                                and score - last_score < self.min_improvement):
+                            logger.info(
+                                f"Page {page_number} quality plateaued at {score}; "
+                                f"stopping refinement early"
+                            )
+                            break
+                        last_score = score
             
-        finally:
-            # Stop browser for this page
-            await self.html_renderer.stop_browser()
+        except Exception as e:
+            logger.warning(f"Refinement loop failed for page {page_number}: {str(e)}")
+        
+        # Collect the overlapped quality analyses; a failed analysis
+        # falls back to the default score
+        quality_scores = []
+        for analysis in await asyncio.gather(*quality_tasks, return_exceptions=True):
+            if isinstance(analysis, Exception):
+                logger.warning(f"Quality analysis failed for page {page_number}: {str(analysis)}")
+                quality_scores.append(7)  # Default score
+            else:
+                quality_scores.append(analysis.get('overall_score', 7))
+        
+        # The pending analyses were the last users of the page cache
+        await self.gemini_client.delete_page_cache(cache_name)
+        
+        # Memoize the refined page for identical images later
+        await asyncio.to_thread(
+            self._store_cached_page, page_key, current_html,
+            max(quality_scores) if quality_scores else 7
+        )
         
         # Calculate processing time
-        processing_time = asyncio.get_event_loop().time() - start_time
+        processing_time = self._clock() - start_time
         
         # Determine final quality score
         final_quality_score = max(quality_scores) if quality_scores else 7
@@ -307,67 +735,56 @@ class RefinementEngine:
             Combined HTML string
         """
         # Sort pages by page number
-        sorted_pages = sorted(pages, key=lambda p: p['page_number'])
-        
-        # Build combined HTML
-        html_parts = [
-            '<!DOCTYPE html>',
-            '<html lang="en">',
-            '<head>',
-            '    <meta charset="UTF-8">',
-            '    <meta name="viewport" content="width=device-width, initial-scale=1.0">',
-            f'    <title>{pdf_info.get("title", "Converted PDF Document")}</title>',
-            '    <style>',
-            '        body { margin: 0; padding: 20px; font-family: Arial, sans-serif; }',
-            '        .pdf-page { margin-bottom: 40px; border-bottom: 2px solid #eee; padding-bottom: 20px; }',
-            '        .page-header { color: #666; font-size: 12px; margin-bottom: 10px; }',
-            '        .page-content { /* Individual page styles will be embedded */ }',
-            '    </style>',
-            '</head>',
-            '<body>'
-        ]
-        
-        # Add each page
+        sorted_pages = sorted(pages, key=itemgetter('page_number'))
+        total_pages = len(sorted_pages)
+        
+        # Assemble as bytes in one buffer: each page's HTML is encoded
+        # once, scanned once, and written once
+        buf = io.BytesIO()
+        title = html.escape(pdf_info.get("title", "Converted PDF Document"))
+        buf.write(_COMBINED_HEADER.replace(b'__TITLE__', title.encode('utf-8')))
+        
         for page in sorted_pages:
-            html_parts.extend([
-                f'    <div class="pdf-page" id="page-{page["page_number"]}">',
-                f'        <div class="page-header">Page {page["page_number"]} of {len(sorted_pages)}</div>',
-                '        <div class="page-content">'
-            ])
+            page_number = page['page_number']
+            buf.write(f'    <div class="pdf-page" id="page-{page_number}">\n'
+                      f'        <div class="page-header">Page {page_number} of {total_pages}</div>\n'
+                      '        <div class="page-content">\n'.encode('utf-8'))
             
-            # Extract body content from individual page HTML
-            page_html = page['html_content']
+            # Extract the inner body: selectolax parses in one C pass when
+            # installed; otherwise partition/rpartition walk the bytes in
+            # two C-level scans. Either way the whole document is the
+            # fallback if no body tags are present
             try:
-                # Extract content between <body> tags
-                body_start = page_html.find('<body')
-                if body_start != -1:
-                    body_start = page_html.find('>', body_start) + 1
-                    body_end = page_html.rfind('</body>')
-                    if body_end != -1:
-                        page_content = page_html[body_start:body_end].strip()
+                if HTMLParser is not None:
+                    body = HTMLParser(page['html_content']).body
+                    if body is not None:
+                        body_html = body.html
+                        page_content = body_html[body_html.find('>') + 1:body_html.rfind('<')]
                     else:
-                        page_content = page_html[body_start:].strip()
+                        page_content = page['html_content']
+                    page_content = page_content.strip().encode('utf-8')
                 else:
-                    # Fallback: use entire HTML if no body tags
-                    page_content = page_html
-                
-                html_parts.append(f'            {page_content}')
-                
+                    page_html = page['html_content'].encode('utf-8')
+                    _, sep, after_open = page_html.partition(b'<body')
+                    if sep:
+                        _, _, after_tag = after_open.partition(b'>')
+                        body_content, closing, _ = after_tag.rpartition(b'</body')
+                        page_content = (body_content if closing else after_tag).strip()
+                    else:
+                        page_content = page_html
+                buf.write(b'            ')
+                buf.write(page_content)
+                buf.write(b'\n')
             except Exception as e:
-                logger.warning(f"Error extracting content from page {page['page_number']}: {str(e)}")
-                html_parts.append(f'            <p>Error rendering page {page["page_number"]}</p>')
+                logger.warning(f"Error extracting content from page {page_number}: {str(e)}")
+                buf.write(f'            <p>Error rendering page {page_number}</p>\n'.encode('utf-8'))
             
-            html_parts.extend([
-                '        </div>',
-                '    </div>'
-            ])
+            buf.write(b'        </div>\n'
+                      b'    </div>\n')
         
-        html_parts.extend([
-            '</body>',
-            '</html>'
-        ])
+        buf.write(_COMBINED_FOOTER)
         
-        return '\n'.join(html_parts)
+        return buf.getvalue().decode('utf-8')
     
     def _generate_fallback_html(self, page_data: Dict) -> str:
         """
@@ -379,70 +796,60 @@ class RefinementEngine:
         Returns:
             Basic HTML string
         """
-        return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Page {page_data['page_number']}</title>
-    <style>
-        body {{
-            margin: 40px;
-            font-family: Arial, sans-serif;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            min-height: 60vh;
-            background-color: #f8f9fa;
-        }}
-        .error-message {{
-            text-align: center;
-            color: #6c757d;
-            padding: 40px;
-            border: 2px dashed #dee2e6;
-            border-radius: 10px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="error-message">
-        <h2>Page {page_data['page_number']}</h2>
-        <p>This page could not be processed automatically.</p>
-        <p><small>Original dimensions: {page_data['width']}pt × {page_data['height']}pt</small></p>
-    </div>
-</body>
-</html>"""
+        return _FALLBACK_TPL.substitute(
+            page_number=page_data['page_number'],
+            width=page_data['width'],
+            height=page_data['height']
+        )
     
-    async def _update_progress(self, task_id: str, message: str, data: Optional[Dict] = None) -> None:
+    async def _update_progress(
+        self,
+        task_id: str,
+        message: str,
+        data: Optional[Dict] = None,
+        force: bool = False
+    ) -> None:
         """
         Send progress update via callback.
-        
+
         Args:
             task_id: Task identifier
             message: Progress message
             data: Optional additional data
+            force: Bypass the throttle; set on page completions and
+                terminal updates, which must never be coalesced away
         """
-        if self.progress_callback:
+        # Coalesce updates that land within the throttle window unless
+        # the caller marked this one as must-deliver
+        now = self._clock()
+        last = self._last_progress_ts.get(task_id, 0.0)
+        if not force and now - last < self._progress_min_interval:
+            return
+        self._last_progress_ts[task_id] = now
+        
+        callback = self._task_callbacks.get(task_id, self.progress_callback)
+        if callback:
             try:
                 update = {
                     'task_id': task_id,
                     'message': message,
-                    'timestamp': asyncio.get_event_loop().time()
+                    'timestamp': now
                 }
                 if data:
                     update.update(data)
-                
+
                 # Call progress callback
-                if asyncio.iscoroutinefunction(self.progress_callback):
-                    await self.progress_callback(update)
+                if asyncio.iscoroutinefunction(callback):
+                    await callback(update)
                 else:
-                    self.progress_callback(update)
+                    callback(update)
                     
             except Exception as e:
                 logger.warning(f"Progress callback failed: {str(e)}")
         
         # Also log the progress
-        logger.info(f"Task {task_id}: {message}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Task {task_id}: {message}")
     
     async def _cleanup_temp_files(self, pages_data: List[Dict]) -> None:
         """
@@ -452,17 +859,41 @@ class RefinementEngine:
             pages_data: List of page data dictionaries
         """
         try:
-            # Clean up PDF page images
-            self.pdf_processor.cleanup_temp_files(pages_data)
+            # Clean up PDF page images off the event loop thread
+            await asyncio.to_thread(self.pdf_processor.cleanup_temp_files, pages_data)
             
             # Clean up screenshots
-            self.html_renderer.cleanup_all_screenshots()
+            await self.html_renderer.cleanup_all_screenshots()
             
             logger.info("Temporary files cleaned up successfully")
             
         except Exception as e:
             logger.warning(f"Error during cleanup: {str(e)}")
     
+    def _persist_task_result(self, task_id: str, pages: List[Dict], combined_html: str) -> None:
+        """Write a task's heavy result fields to a gzipped JSON file."""
+        try:
+            payload = gzip.compress(orjson.dumps({
+                'pages': pages,
+                'combined_html': combined_html
+            }))
+            target = self._persist_dir / f"{task_id}.json.gz"
+            tmp_file = target.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+            tmp_file.write_bytes(payload)
+            os.replace(tmp_file, target)
+        except Exception as e:
+            logger.warning(f"Failed to persist results for task {task_id}: {str(e)}")
+
+    def _load_task_result(self, task_id: str) -> Optional[Dict]:
+        """Load a task's persisted result fields from disk, if present."""
+        target = self._persist_dir / f"{task_id}.json.gz"
+        try:
+            if target.exists():
+                return orjson.loads(gzip.decompress(target.read_bytes()))
+        except Exception as e:
+            logger.warning(f"Failed to load persisted results for task {task_id}: {str(e)}")
+        return None
+
     def get_task_status(self, task_id: str) -> Optional[Dict]:
         """
         Get current status of a task.
@@ -473,7 +904,17 @@ class RefinementEngine:
         Returns:
             Task status dictionary or None if not found
         """
-        return self.active_tasks.get(task_id)
+        task_info = self.active_tasks.get(task_id)
+        if task_info is None:
+            return None
+        
+        # Completed tasks keep their heavy fields on disk; merge them in
+        # for the caller without re-inflating the in-memory entry
+        if task_info.get('status') == 'completed' and 'combined_html' not in task_info:
+            persisted = self._load_task_result(task_id)
+            if persisted:
+                return {**task_info, **persisted}
+        return task_info
     
     def cleanup_task(self, task_id: str) -> None:
         """
@@ -484,9 +925,20 @@ class RefinementEngine:
         """
         if task_id in self.active_tasks:
             del self.active_tasks[task_id]
+            self._last_progress_ts.pop(task_id, None)
             logger.info(f"Task {task_id} cleaned up")
 
 
+@functools.lru_cache(maxsize=8)
+def _get_engine(temp_dir: str, screenshots_dir: str, max_iterations: int) -> RefinementEngine:
+    """Memoized engine per configuration; construction sets up clients."""
+    return RefinementEngine(
+        temp_dir=temp_dir,
+        screenshots_dir=screenshots_dir,
+        max_iterations=max_iterations
+    )
+
+
 # Utility function for easy access
 async def convert_pdf_with_refinement(
     pdf_path: str,
@@ -498,6 +950,10 @@ async def convert_pdf_with_refinement(
     """
     Convenience function to convert PDF with refinement.
     
+    Reuses one engine per (temp_dir, screenshots_dir, max_iterations)
+    configuration instead of rebuilding the Gemini client, renderer,
+    and PDF processor on every call.
+    
     Args:
         pdf_path: Path to PDF file
         temp_dir: Directory for temporary files
@@ -508,11 +964,5 @@ async def convert_pdf_with_refinement(
     Returns:
         Conversion results dictionary
     """
-    engine = RefinementEngine(
-        temp_dir=temp_dir,
-        screenshots_dir=screenshots_dir,
-        max_iterations=max_iterations,
-        progress_callback=progress_callback
-    )
-    
-    return await engine.convert_pdf_to_html(pdf_path)
+    engine = _get_engine(temp_dir, screenshots_dir, max_iterations)
+    return await engine.convert_pdf_to_html(pdf_path, progress_callback=progress_callback)
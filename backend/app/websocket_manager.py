@@ -6,18 +6,36 @@ Handles connection lifecycle, task tracking, and message broadcasting.
 """
 
 import asyncio
-import json
+import base64
+import orjson
+import os
 import uuid
+import zstandard
+from collections import deque
 from typing import Dict, List, Optional, Any
 import logging
 from fastapi import WebSocket, WebSocketDisconnect
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from types import MappingProxyType
 import time
 
 logger = logging.getLogger(__name__)
 
+# Wall clock bound once at import; the send path stamps every message,
+# so skip the module attribute lookup on each call
+_now = time.time
 
-@dataclass
+# The connection greeting is fixed except for the task id, so the frame
+# is spliced from this template instead of running the general encoder.
+# Only fully static schemas get this treatment: every other frame type
+# carries arbitrary text that needs real JSON escaping
+_CONNECTION_TPL = (
+    b'{"type":"connection","status":"connected","task_id":"%b",'
+    b'"message":"Connected successfully. Waiting for PDF processing to begin..."}'
+)
+
+
+@dataclass(slots=True)
 class ProgressUpdate:
     """Data structure for progress updates."""
     task_id: str
@@ -28,13 +46,14 @@ class ProgressUpdate:
     page_html: Optional[str] = None
     timestamp: Optional[float] = None
     data: Optional[Dict] = None
+    type: str = 'progress'
     
     def __post_init__(self):
         if self.timestamp is None:
-            self.timestamp = time.time()
+            self.timestamp = _now()
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskCompletion:
     """Data structure for task completion."""
     task_id: str
@@ -44,21 +63,101 @@ class TaskCompletion:
     processing_time: float = 0
     errors: List[str] = None
     timestamp: Optional[float] = None
+    type: str = 'task_completed'
     
     def __post_init__(self):
         if self.timestamp is None:
-            self.timestamp = time.time()
+            self.timestamp = _now()
         if self.errors is None:
             self.errors = []
 
 
+class _OutboundQueue:
+    """
+    Bounded outbound message buffer with a latest-wins progress slot.
+    
+    Progress frames are pure status — only the most recent one matters —
+    so they occupy a single slot that new frames overwrite instead of
+    queueing behind each other. Everything else queues in order with
+    back-pressure once the buffer is full, and the pending progress
+    frame is delivered whenever the ordered queue is drained.
+    """
+    
+    def __init__(self, maxsize: int = 256):
+        self._maxsize = maxsize
+        self._items: deque = deque()
+        self._progress: Optional[Any] = None
+        self._closed = False
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    async def put(self, item: Any) -> None:
+        """
+        Enqueue an ordered item, waiting while the buffer is full.
+
+        Raises:
+            RuntimeError: If the queue was closed, including while a
+                caller was blocked waiting for space
+        """
+        while len(self._items) >= self._maxsize:
+            if self._closed:
+                raise RuntimeError("outbound queue is closed")
+            self._not_full.clear()
+            await self._not_full.wait()
+        if self._closed:
+            raise RuntimeError("outbound queue is closed")
+        self._items.append(item)
+        self._not_empty.set()
+    
+    def put_progress(self, item: Any) -> None:
+        """Set the latest-wins progress slot; never blocks or grows."""
+        self._progress = item
+        self._not_empty.set()
+    
+    async def get(self) -> Any:
+        """Dequeue the next item, preferring ordered messages."""
+        while True:
+            if self._items:
+                item = self._items.popleft()
+                if len(self._items) < self._maxsize:
+                    self._not_full.set()
+                return item
+            if self._progress is not None:
+                item = self._progress
+                self._progress = None
+                return item
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def close(self) -> None:
+        """
+        Mark the queue closed and wake any blocked putters.
+
+        Called when the owning connection is reaped so producers stuck
+        in put() fail fast instead of waiting on a drain that will
+        never happen.
+        """
+        self._closed = True
+        self._not_full.set()
+        self._not_empty.set()
+
+
 class WebSocketManager:
     """
     Manages WebSocket connections and handles real-time communication.
     """
     
-    def __init__(self):
-        """Initialize the WebSocket manager."""
+    def __init__(self, send_timeout: float = 5.0):
+        """
+        Initialize the WebSocket manager.
+        
+        Args:
+            send_timeout: Seconds a single socket send may take before
+                the client is considered stuck and dropped
+        """
+        self.send_timeout = send_timeout
+        
         # Active connections mapped by task_id
         self.active_connections: Dict[str, WebSocket] = {}
         
@@ -68,6 +167,33 @@ class WebSocketManager:
         # Connection metadata
         self.connection_metadata: Dict[str, Dict] = {}
         
+        # Bound concurrent broadcast sends so a very large fan-out
+        # cannot exhaust file descriptors
+        self._broadcast_sem = asyncio.Semaphore(100)
+        
+        # Per-connection outbound queue and its single writer task;
+        # producers enqueue and never block on the socket itself
+        self.outbound: Dict[str, _OutboundQueue] = {}
+        self._writer_tasks: Dict[str, "asyncio.Task"] = {}
+        
+        # Recycled ProgressUpdate instances; page-completion streams
+        # otherwise allocate one per callback
+        self._progress_pool: deque = deque(maxlen=512)
+        
+        # Page HTML larger than this is zstd-compressed before sending
+        self._compress_threshold = 4096
+        self._zstd_level = 3
+        
+        # Last integer percentage sent per task, to skip redundant
+        # status writes when the bucket has not moved
+        self._last_pct: Dict[str, int] = {}
+        
+        # Background sweep that evicts stale task state if a cleanup
+        # path was missed; started lazily on the first connection
+        self._gc_task: Optional["asyncio.Task"] = None
+        self._gc_interval = 60
+        self._status_ttl = int(os.getenv("WS_STATUS_TTL_SEC", "3600"))
+        
         logger.info("WebSocket manager initialized")
     
     async def connect(self, websocket: WebSocket, task_id: str) -> bool:
@@ -84,15 +210,35 @@ class WebSocketManager:
         try:
             await websocket.accept()
             
+            # The sweep task needs a running loop, so it starts here
+            # rather than in __init__
+            if self._gc_task is None:
+                self._gc_task = asyncio.create_task(self._gc_loop())
+            
             # Store the connection
             self.active_connections[task_id] = websocket
             
-            # Initialize connection metadata
-            self.connection_metadata[task_id] = {
-                'connected_at': time.time(),
-                'last_activity': time.time(),
-                'messages_sent': 0
+            # Initialize connection metadata (one clock read for both).
+            # Clients opt in to compressed page HTML via ?compress=zstd;
+            # anyone not advertising it gets plain HTML
+            now = _now()
+            metadata = {
+                'connected_at': now,
+                'last_activity': now,
+                'messages_sent': 0,
+                'compression': websocket.query_params.get('compress')
             }
+            self.connection_metadata[task_id] = metadata
+            
+            # One writer task owns the socket; everything outbound goes
+            # through its queue so producers never block on a slow
+            # client. The metadata dict rides along in the closure so
+            # drained messages touch no manager-level dictionaries
+            queue = _OutboundQueue(maxsize=256)
+            self.outbound[task_id] = queue
+            self._writer_tasks[task_id] = asyncio.create_task(
+                self._writer_loop(task_id, websocket, queue, metadata)
+            )
             
             # Initialize task status if not exists
             if task_id not in self.task_statuses:
@@ -101,18 +247,24 @@ class WebSocketManager:
                     'progress_percentage': 0,
                     'current_page': 0,
                     'total_pages': 0,
-                    'messages': []
+                    'last_seen': now,
+                    'messages': deque(maxlen=50)  # Bounded message history
                 }
             
             logger.info(f"WebSocket connected for task {task_id}")
             
-            # Send initial connection confirmation
-            await self._send_message(task_id, {
-                'type': 'connection',
-                'status': 'connected',
-                'task_id': task_id,
-                'message': 'Connected successfully. Waiting for PDF processing to begin...'
-            })
+            # Send initial connection confirmation from the prebuilt
+            # template; the dict form still goes into the history so
+            # status readers see the same shape as before
+            status = self.task_statuses.get(task_id)
+            if status is not None:
+                status['messages'].append({
+                    'type': 'connection',
+                    'status': 'connected',
+                    'task_id': task_id,
+                    'message': 'Connected successfully. Waiting for PDF processing to begin...'
+                })
+            await queue.put(_CONNECTION_TPL % task_id.encode('utf-8'))
             
             return True
             
@@ -128,17 +280,64 @@ class WebSocketManager:
             task_id: Task identifier
         """
         try:
-            if task_id in self.active_connections:
-                del self.active_connections[task_id]
+            self.active_connections.pop(task_id, None)
+            
+            # Close the queue first so any producer blocked in put()
+            # wakes up and errors out instead of hanging forever
+            queue = self.outbound.pop(task_id, None)
+            if queue is not None:
+                queue.close()
+            writer_task = self._writer_tasks.pop(task_id, None)
+            if writer_task is not None:
+                writer_task.cancel()
                 
-            if task_id in self.connection_metadata:
-                connection_time = time.time() - self.connection_metadata[task_id]['connected_at']
+            metadata = self.connection_metadata.pop(task_id, None)
+            if metadata is not None:
+                connection_time = _now() - metadata['connected_at']
                 logger.info(f"WebSocket disconnected for task {task_id} after {connection_time:.2f}s")
-                del self.connection_metadata[task_id]
                 
         except Exception as e:
             logger.warning(f"Error disconnecting WebSocket for task {task_id}: {str(e)}")
     
+    def _acquire_progress(self, **fields: Any) -> ProgressUpdate:
+        """
+        Get a ProgressUpdate, reusing a pooled instance when available.
+        
+        Args:
+            fields: Field values to set on the instance
+            
+        Returns:
+            A ProgressUpdate populated with the given fields
+        """
+        try:
+            update = self._progress_pool.pop()
+        except IndexError:
+            return ProgressUpdate(**fields)
+        
+        update.progress_percentage = None
+        update.current_page = None
+        update.total_pages = None
+        update.page_html = None
+        update.timestamp = _now()
+        update.data = None
+        for name, value in fields.items():
+            setattr(update, name, value)
+        return update
+    
+    def _release_progress(self, update: ProgressUpdate) -> None:
+        """
+        Return a ProgressUpdate to the pool.
+        
+        Large references are dropped on release so a pooled instance
+        never keeps page HTML alive.
+        
+        Args:
+            update: The instance to recycle
+        """
+        update.page_html = None
+        update.data = None
+        self._progress_pool.append(update)
+    
     async def send_progress_update(self, update: ProgressUpdate) -> bool:
         """
         Send a progress update to the connected WebSocket.
@@ -149,10 +348,12 @@ class WebSocketManager:
         Returns:
             True if sent successfully, False otherwise
         """
-        return await self._send_message(update.task_id, {
-            'type': 'progress',
-            **asdict(update)
-        })
+        # Encode before enqueueing so a pooled instance can be recycled
+        # as soon as this returns; the writer would otherwise hold a
+        # reference until the frame actually goes out. Progress frames
+        # are latest-wins, so a slow client only ever holds one
+        payload = orjson.dumps(update, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return await self._send_message(update.task_id, payload, coalesce=True)
     
     async def send_page_completion(self, task_id: str, page_number: int, page_html: str, current_page: int, total_pages: int) -> bool:
         """
@@ -168,29 +369,69 @@ class WebSocketManager:
         Returns:
             True if sent successfully, False otherwise
         """
-        # Calculate progress percentage
-        progress_percentage = int((current_page / total_pages) * 100) if total_pages > 0 else 0
+        # Calculate progress percentage with integer arithmetic (no
+        # float round-trip) and remember the last bucket per task
+        progress_percentage = (current_page * 100) // total_pages if total_pages > 0 else 0
+        pct_changed = progress_percentage != self._last_pct.get(task_id, -1)
+        if pct_changed:
+            self._last_pct[task_id] = progress_percentage
         
-        # Update task status
-        if task_id in self.task_statuses:
-            self.task_statuses[task_id].update({
-                'current_page': current_page,
-                'total_pages': total_pages,
-                'progress_percentage': progress_percentage
-            })
+        # Large page HTML dominates the frame; compress it off the event
+        # loop so bytes on the wire shrink without stalling other sends.
+        # Only clients that advertised zstd support at connect time get
+        # compressed payloads — everyone else receives plain HTML
+        metadata = self.connection_metadata.get(task_id)
+        client_zstd = metadata is not None and metadata.get('compression') == 'zstd'
+        page_html_encoding = None
+        if client_zstd and page_html and len(page_html) > self._compress_threshold:
+            loop = asyncio.get_running_loop()
+            page_html = await loop.run_in_executor(None, self._compress_html, page_html)
+            page_html_encoding = 'zstd+b64'
+        
+        # Update task status; when the percentage bucket is unchanged
+        # only the page counter moves
+        status = self.task_statuses.get(task_id)
+        if status is not None:
+            if pct_changed:
+                status.update({
+                    'current_page': current_page,
+                    'total_pages': total_pages,
+                    'progress_percentage': progress_percentage
+                })
+            else:
+                status['current_page'] = current_page
         
         return await self._send_message(task_id, {
             'type': 'page_completed',
             'task_id': task_id,
             'page_number': page_number,
             'page_html': page_html,
+            'page_html_encoding': page_html_encoding,
             'current_page': current_page,
             'total_pages': total_pages,
             'progress_percentage': progress_percentage,
-            'timestamp': time.time(),
+            'timestamp': _now(),
             'message': f'Completed page {page_number} of {total_pages}'
         })
     
+    def _compress_html(self, html_content: str) -> str:
+        """
+        Compress HTML for transport as base64-wrapped zstd.
+        
+        A compressor is built per call: ZstdCompressor instances are not
+        safe for concurrent use and this runs on executor threads.
+        
+        Args:
+            html_content: HTML string to compress
+            
+        Returns:
+            Base64 string of the zstd-compressed HTML
+        """
+        compressed = zstandard.ZstdCompressor(level=self._zstd_level).compress(
+            html_content.encode('utf-8')
+        )
+        return base64.b64encode(compressed).decode('ascii')
+    
     async def send_task_completion(self, completion: TaskCompletion) -> bool:
         """
         Send task completion notification.
@@ -202,16 +443,14 @@ class WebSocketManager:
             True if sent successfully, False otherwise
         """
         # Update task status
-        if completion.task_id in self.task_statuses:
-            self.task_statuses[completion.task_id].update({
+        status = self.task_statuses.get(completion.task_id)
+        if status is not None:
+            status.update({
                 'status': completion.status,
                 'progress_percentage': 100 if completion.status == 'success' else 0
             })
         
-        return await self._send_message(completion.task_id, {
-            'type': 'task_completed',
-            **asdict(completion)
-        })
+        return await self._send_message(completion.task_id, completion)
     
     async def send_error(self, task_id: str, error_message: str, error_code: Optional[str] = None) -> bool:
         """
@@ -226,8 +465,9 @@ class WebSocketManager:
             True if sent successfully, False otherwise
         """
         # Update task status
-        if task_id in self.task_statuses:
-            self.task_statuses[task_id].update({
+        status = self.task_statuses.get(task_id)
+        if status is not None:
+            status.update({
                 'status': 'error',
                 'error_message': error_message
             })
@@ -237,53 +477,260 @@ class WebSocketManager:
             'task_id': task_id,
             'message': error_message,
             'error_code': error_code,
-            'timestamp': time.time()
+            'timestamp': _now()
         })
     
-    async def _send_message(self, task_id: str, message_data: Dict) -> bool:
+    async def _send_message(self, task_id: str, message_data: Any, coalesce: bool = False) -> bool:
         """
         Send a message to a specific WebSocket connection.
         
         Args:
             task_id: Task identifier
-            message_data: Message data to send
+            message_data: Message data to send; a plain dictionary or a
+                dataclass instance (orjson serializes both natively)
+            coalesce: Treat the message as latest-wins progress traffic;
+                it replaces any still-pending progress frame instead of
+                queueing behind it
             
         Returns:
             True if sent successfully, False otherwise
         """
-        if task_id not in self.active_connections:
+        queue = self.outbound.get(task_id)
+        if queue is None:
             logger.warning(f"No active WebSocket connection for task {task_id}")
             return False
         
         try:
-            websocket = self.active_connections[task_id]
-            
-            # Add the message to task status history
-            if task_id in self.task_statuses:
-                if len(self.task_statuses[task_id]['messages']) > 50:  # Limit message history
-                    self.task_statuses[task_id]['messages'].pop(0)
-                self.task_statuses[task_id]['messages'].append(message_data)
-            
-            # Send the message
-            message_json = json.dumps(message_data, default=str)  # default=str handles datetime objects
-            await websocket.send_text(message_json)
+            # Add the message to task status history; pre-encoded frames
+            # are transient progress traffic and are not recorded. The
+            # deque evicts the oldest entry on its own once full
+            if not isinstance(message_data, (bytes, bytearray)):
+                status = self.task_statuses.get(task_id)
+                if status is not None:
+                    status['last_seen'] = _now()
+                    status['messages'].append(message_data)
             
-            # Update connection metadata
-            if task_id in self.connection_metadata:
-                self.connection_metadata[task_id]['last_activity'] = time.time()
-                self.connection_metadata[task_id]['messages_sent'] += 1
+            # Hand off to the connection's writer; the bounded queue
+            # applies back-pressure if the client cannot keep up, and
+            # progress frames collapse into a single pending slot
+            if coalesce:
+                queue.put_progress(message_data)
+            else:
+                await queue.put(message_data)
             
-            logger.debug(f"Sent WebSocket message to task {task_id}: {message_data.get('type', 'unknown')}")
+            if logger.isEnabledFor(logging.DEBUG):
+                message_type = getattr(
+                    message_data, 'type', None
+                ) or (message_data.get('type', 'unknown') if isinstance(message_data, dict) else 'unknown')
+                logger.debug(f"Queued WebSocket message for task {task_id}: {message_type}")
             return True
             
+        except Exception as e:
+            logger.error(f"Error queueing WebSocket message for task {task_id}: {str(e)}")
+            return False
+    
+    async def _writer_loop(
+        self,
+        task_id: str,
+        websocket: WebSocket,
+        queue: _OutboundQueue,
+        metadata: Dict
+    ) -> None:
+        """
+        Drain one connection's outbound queue onto its socket.
+        
+        Runs as a single long-lived task per connection, so socket writes
+        are serialized in order and producers only pay an enqueue. Items
+        are either message dictionaries or pre-serialized bytes (from
+        broadcast). The connection's state is bound here once, so the
+        per-message path performs no manager-level dict lookups.
+        
+        Args:
+            task_id: Task identifier
+            websocket: The WebSocket connection this writer owns
+            queue: Outbound queue feeding this writer
+            metadata: This connection's metadata dictionary
+        """
+        try:
+            while True:
+                message_data = await queue.get()
+                
+                # orjson encodes straight to bytes and serializes
+                # dataclasses natively, so callers can pass ProgressUpdate
+                # or TaskCompletion instances without an asdict() copy;
+                # default=str handles datetime objects. Broadcast payloads
+                # arrive pre-encoded
+                if isinstance(message_data, (bytes, bytearray)):
+                    payload = message_data
+                else:
+                    payload = orjson.dumps(
+                        message_data, default=str, option=orjson.OPT_NON_STR_KEYS
+                    )
+                # A saturated client can block a send indefinitely;
+                # bound it so a stuck socket gets reaped instead of
+                # wedging this writer forever
+                await asyncio.wait_for(
+                    websocket.send_bytes(payload), timeout=self.send_timeout
+                )
+                
+                # Update connection metadata (bound in the closure)
+                metadata['last_activity'] = _now()
+                metadata['messages_sent'] += 1
+                
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out for task {task_id}; dropping connection")
+            self.disconnect(task_id)
         except WebSocketDisconnect:
             logger.info(f"WebSocket disconnected for task {task_id} while sending message")
             self.disconnect(task_id)
-            return False
         except Exception as e:
             logger.error(f"Error sending WebSocket message to task {task_id}: {str(e)}")
-            # Don't disconnect on send errors, might be temporary
-            return False
+            self.disconnect(task_id)
+    
+    async def broadcast_page_completion(
+        self,
+        task_ids: List[str],
+        page_number: int,
+        page_html: str,
+        current_page: int,
+        total_pages: int
+    ) -> int:
+        """
+        Send one page-completion frame to several watchers.
+        
+        The heavy shared fields — page_html above all — are serialized
+        exactly once; each recipient's frame is assembled by splicing its
+        task_id in front of the shared bytes, so the HTML is never
+        re-encoded per recipient.
+        
+        Args:
+            task_ids: Task identifiers watching this page
+            page_number: Completed page number
+            page_html: Generated HTML for the page
+            current_page: Current progress (pages completed)
+            total_pages: Total pages to process
+            
+        Returns:
+            Number of connections the frame was queued for
+        """
+        progress_percentage = (current_page * 100) // total_pages if total_pages > 0 else 0
+
+        # The frame is shared by every recipient, so compression is only
+        # worthwhile when all of them advertised zstd support at connect
+        # time; a single plain client forces plain HTML for the fan-out
+        all_zstd = bool(task_ids) and all(
+            (self.connection_metadata.get(task_id) or {}).get('compression') == 'zstd'
+            for task_id in task_ids
+        )
+        page_html_encoding = None
+        if all_zstd and page_html and len(page_html) > self._compress_threshold:
+            loop = asyncio.get_running_loop()
+            page_html = await loop.run_in_executor(None, self._compress_html, page_html)
+            page_html_encoding = 'zstd+b64'
+        
+        shared = orjson.dumps({
+            'type': 'page_completed',
+            'page_number': page_number,
+            'page_html': page_html,
+            'page_html_encoding': page_html_encoding,
+            'current_page': current_page,
+            'total_pages': total_pages,
+            'progress_percentage': progress_percentage,
+            'timestamp': _now(),
+            'message': f'Completed page {page_number} of {total_pages}'
+        })
+        
+        delivered = 0
+        for task_id in task_ids:
+            queue = self.outbound.get(task_id)
+            if queue is None:
+                continue
+            # Task ids are UUID strings, so raw splicing needs no escaping
+            payload = b'{"task_id":"' + task_id.encode('utf-8') + b'",' + shared[1:]
+            await queue.put(payload)
+            delivered += 1
+        return delivered
+    
+    async def broadcast(self, task_ids: List[str], message_data: Dict) -> int:
+        """
+        Send one message to several connected tasks concurrently.
+        
+        The payload is serialized once and the sends run in parallel, so
+        a slow client only delays its own delivery instead of the whole
+        fan-out. Connections that disconnect or time out are removed.
+        
+        Args:
+            task_ids: Task identifiers to deliver the message to
+            message_data: Message data to send
+            
+        Returns:
+            Number of connections the message was delivered to
+        """
+        payload = orjson.dumps(message_data, default=str)
+        targets = [
+            task_id for task_id in task_ids
+            if task_id in self.outbound
+        ]
+        if not targets:
+            return 0
+        
+        async def _send_one(task_id: str) -> None:
+            async with self._broadcast_sem:
+                await asyncio.wait_for(
+                    self.outbound[task_id].put(payload),
+                    timeout=5
+                )
+        
+        results = await asyncio.gather(
+            *[_send_one(task_id) for task_id in targets],
+            return_exceptions=True
+        )
+        
+        delivered = 0
+        for task_id, outcome in zip(targets, results):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.info(f"WebSocket for task {task_id} backed up during broadcast; dropping it")
+                self.disconnect(task_id)
+            elif isinstance(outcome, Exception):
+                logger.error(f"Error broadcasting to task {task_id}: {str(outcome)}")
+            else:
+                delivered += 1
+        return delivered
+    
+    async def _gc_loop(self) -> None:
+        """
+        Periodically evict stale task state.
+        
+        cleanup_task is the normal exit path, but an error during
+        disconnect can strand entries — including message histories that
+        reference page HTML. Anything without an active connection that
+        has been idle past the TTL is swept here.
+        """
+        while True:
+            await asyncio.sleep(self._gc_interval)
+            try:
+                now = _now()
+                evicted = 0
+                
+                for task_id, metadata in list(self.connection_metadata.items()):
+                    if (task_id not in self.active_connections
+                            and now - metadata['last_activity'] > self._status_ttl):
+                        self.connection_metadata.pop(task_id, None)
+                        evicted += 1
+                
+                for task_id, status in list(self.task_statuses.items()):
+                    if (task_id not in self.active_connections
+                            and now - status.get('last_seen', 0) > self._status_ttl):
+                        self.task_statuses.pop(task_id, None)
+                        self._last_pct.pop(task_id, None)
+                        evicted += 1
+                
+                if evicted:
+                    logger.info(f"Swept {evicted} stale WebSocket task entries")
+            except Exception as e:
+                logger.warning(f"WebSocket state sweep failed: {str(e)}")
     
     def get_task_status(self, task_id: str) -> Optional[Dict]:
         """
@@ -295,7 +742,12 @@ class WebSocketManager:
         Returns:
             Task status dictionary or None if not found
         """
-        return self.task_statuses.get(task_id)
+        status = self.task_statuses.get(task_id)
+        if status is None:
+            return None
+        
+        # Hand out the history as a plain list; the deque stays internal
+        return {**status, 'messages': list(status['messages'])}
     
     def is_connected(self, task_id: str) -> bool:
         """
@@ -331,10 +783,10 @@ class WebSocketManager:
         try:
             # Disconnect if still connected
             self.disconnect(task_id)
+            self._last_pct.pop(task_id, None)
             
             # Clean up task status
-            if task_id in self.task_statuses:
-                del self.task_statuses[task_id]
+            self.task_statuses.pop(task_id, None)
             
             logger.info(f"Cleaned up WebSocket data for task {task_id}")
             
@@ -355,9 +807,10 @@ class WebSocketManager:
         Get status of all active tasks.
         
         Returns:
-            Dictionary of all task statuses
+            Read-only view of all task statuses; callers that need an
+            independent snapshot should copy it themselves
         """
-        return self.task_statuses.copy()
+        return MappingProxyType(self.task_statuses)
 
 
 # Global WebSocket manager instance
@@ -389,8 +842,9 @@ async def create_progress_callback(task_id: str):
             if current_page is not None and total_pages is not None and total_pages > 0:
                 progress_percentage = int((current_page / total_pages) * 100)
             
-            # Create progress update
-            update = ProgressUpdate(
+            # Create progress update from the pool and recycle it once
+            # the frame has been handed off
+            update = websocket_manager._acquire_progress(
                 task_id=task_id,
                 message=message,
                 progress_percentage=progress_percentage,
@@ -401,7 +855,10 @@ async def create_progress_callback(task_id: str):
             )
             
             # Send via WebSocket
-            await websocket_manager.send_progress_update(update)
+            try:
+                await websocket_manager.send_progress_update(update)
+            finally:
+                websocket_manager._release_progress(update)
             
         except Exception as e:
             logger.error(f"Error in progress callback for task {task_id}: {str(e)}")
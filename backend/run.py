@@ -0,0 +1,34 @@
+"""
+Server Entrypoint
+
+Starts the PDF to HTML Converter API with uvicorn. Kept separate from
+app.main so importing the application module never pulls in the server.
+"""
+
+import os
+
+import uvicorn
+import uvloop
+
+if __name__ == "__main__":
+    # Make every loop in this process (including any created before
+    # uvicorn starts its workers) a uvloop one
+    uvloop.install()
+    
+    # Auto-reload forces a single worker; keep it behind a dev flag
+    dev_mode = os.getenv("DEV") == "1"
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        # Task state (conversion results, WebSocket connections, the
+        # refinement engine) lives in process memory, so requests for a
+        # task must all hit the worker that accepted the upload. One
+        # worker is the only safe default; WORKERS>1 is an explicit
+        # opt-in for deployments that add sticky routing/shared state
+        workers=1 if dev_mode else int(os.getenv("WORKERS", "1")),
+        loop="uvloop",
+        http="httptools",
+        reload=dev_mode,
+        log_level="info" if dev_mode else "warning"
+    )
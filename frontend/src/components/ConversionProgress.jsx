@@ -1,6 +1,10 @@
 import { useState, useEffect, useRef } from 'react';
 import './ConversionProgress.css';
 
+// The backend sends messages as binary WebSocket frames; decode them
+// back to JSON text with a single shared decoder
+const utf8Decoder = new TextDecoder('utf-8');
+
 const ConversionProgress = ({ taskId, onCompletion, onError }) => {
   const [connectionStatus, setConnectionStatus] = useState('connecting');
   const [progress, setProgress] = useState({
@@ -34,6 +38,9 @@ const ConversionProgress = ({ taskId, onCompletion, onError }) => {
       addLog('info', `Connecting to WebSocket: ${wsUrl}`);
       
       websocketRef.current = new WebSocket(wsUrl);
+      // Receive binary frames as ArrayBuffer so they can be decoded
+      // synchronously instead of going through a Blob read
+      websocketRef.current.binaryType = 'arraybuffer';
 
       websocketRef.current.onopen = () => {
         setConnectionStatus('connected');
@@ -48,7 +55,10 @@ const ConversionProgress = ({ taskId, onCompletion, onError }) => {
 
       websocketRef.current.onmessage = (event) => {
         try {
-          const data = JSON.parse(event.data);
+          const raw = typeof event.data === 'string'
+            ? event.data
+            : utf8Decoder.decode(event.data);
+          const data = JSON.parse(raw);
           handleWebSocketMessage(data);
         } catch (error) {
           addLog('error', `Error parsing WebSocket message: ${error.message}`);
@@ -10,9 +10,26 @@ import os
 import sys
 from pathlib import Path
 
+# Each checked path used to cost its own stat() call; instead every
+# parent directory is scanned once and its entries memoized here
+_dir_cache = {}
+
+def _dir_entries(parent):
+    """Scan a directory once and memoize its entries by name."""
+    parent = Path(parent)
+    entries = _dir_cache.get(parent)
+    if entries is None:
+        try:
+            entries = {entry.name: entry for entry in os.scandir(parent)}
+        except OSError:
+            entries = {}
+        _dir_cache[parent] = entries
+    return entries
+
 def check_file_exists(filepath, description):
     """Check if a file exists and report status."""
-    if Path(filepath).exists():
+    path = Path(filepath)
+    if path.name in _dir_entries(path.parent):
         print(f"✅ {description}: {filepath}")
         return True
     else:
@@ -21,13 +38,25 @@ def check_file_exists(filepath, description):
 
 def check_directory_exists(dirpath, description):
     """Check if a directory exists and report status."""
-    if Path(dirpath).is_dir():
+    path = Path(dirpath)
+    entry = _dir_entries(path.parent).get(path.name)
+    if entry is not None and entry.is_dir():
         print(f"✅ {description}: {dirpath}")
         return True
     else:
         print(f"❌ {description}: {dirpath} (MISSING)")
         return False
 
+def check_module_importable(module_name, description):
+    """Check if a Python module can be imported and report status."""
+    try:
+        __import__(module_name)
+        print(f"✅ {description}: {module_name}")
+        return True
+    except ImportError:
+        print(f"❌ {description}: {module_name} (NOT INSTALLED)")
+        return False
+
 def main():
     """Run comprehensive health checks."""
     print("🔍 PDF to HTML Converter - Health Check")
@@ -100,6 +129,18 @@ def main():
         if check_file_exists(filepath, desc):
             checks_passed += 1
     
+    # Performance-critical runtime dependencies
+    print("\n⚡ Performance Runtime:")
+    runtime_checks = [
+        ("uvloop", "uvloop event loop"),
+        ("orjson", "orjson serializer"),
+    ]
+    
+    for module_name, desc in runtime_checks:
+        total_checks += 1
+        if check_module_importable(module_name, desc):
+            checks_passed += 1
+    
     # Environment check
     print("\n🔧 Configuration:")
     config_checks = [